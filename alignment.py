@@ -0,0 +1,140 @@
+import re
+
+import numpy as np
+
+DEFAULT_BAND = 64
+DIAGONAL, UP, LEFT = 0, 1, 2
+
+def normalize_token(text: str) -> str:
+    # Case, punctuation and curly quotes should never decide whether two words match.
+    return re.sub(r"[^\w']+", "", str(text).lower().replace("’", "'")).strip("'")
+
+def token_ids(source, target):
+    vocabulary = {}
+    encode = lambda tokens: np.array([vocabulary.setdefault(normalize_token(t), len(vocabulary)) for t in tokens],
+                                     dtype=np.int64)
+    return encode(source), encode(target)
+
+def _banded_alignment(a, b, width):
+    """One banded pass; also returns the path's edit cost and whether it ran along the band edge."""
+    n, m = len(a), len(b)
+
+    def row_range(i):
+        centre = (i * m + n // 2) // n
+        return max(0, centre - width), min(m, centre + width)
+
+    inf = n + m + 1
+    lo, hi = row_range(0)
+    previous = np.arange(lo, hi + 1, dtype=np.int64)
+    prev_lo = lo
+    pointers, offsets = [np.full(hi - lo + 1, LEFT, dtype=np.uint8)], [lo]
+
+    for i in range(1, n + 1):
+        lo, hi = row_range(i)
+        cols = np.arange(lo, hi + 1)
+
+        up = np.full(len(cols), inf, dtype=np.int64)
+        inside = (cols >= prev_lo) & (cols < prev_lo + len(previous))
+        up[inside] = previous[cols[inside] - prev_lo] + 1
+
+        diagonal = np.full(len(cols), inf, dtype=np.int64)
+        inside = (cols >= 1) & (cols - 1 >= prev_lo) & (cols - 1 < prev_lo + len(previous))
+        diagonal[inside] = previous[cols[inside] - 1 - prev_lo] + (b[cols[inside] - 1] != a[i - 1])
+
+        best = np.minimum(diagonal, up)
+        pointer = np.where(diagonal <= up, DIAGONAL, UP).astype(np.uint8)
+        row = np.minimum.accumulate(best - cols) + cols
+        pointer[row < best] = LEFT
+
+        pointers.append(pointer)
+        offsets.append(lo)
+        previous, prev_lo = row, lo
+
+    matches, exact = [None] * n, [False] * n
+    on_edge = False
+    i, j = n, m
+    while i > 0:
+        lo, hi = offsets[i], offsets[i] + len(pointers[i]) - 1
+        on_edge = on_edge or (j == lo and lo > 0) or (j == hi and hi < m)
+        move = pointers[i][j - lo] if lo <= j <= hi else UP
+        if move == DIAGONAL:
+            matches[i - 1] = j - 1
+            exact[i - 1] = bool(a[i - 1] == b[j - 1])
+            i, j = i - 1, j - 1
+        elif move == UP:
+            i -= 1
+        else:
+            j -= 1
+    return matches, exact, int(previous[m - prev_lo]), on_edge
+
+def _longest_substitution_run(matches, exact):
+    longest = run = 0
+    for match, same in zip(matches, exact):
+        run = run + 1 if match is not None and not same else 0
+        longest = max(longest, run)
+    return longest
+
+def align_tokens(source, target, band: int = DEFAULT_BAND):
+    """Globally align two token lists with unit-cost edit distance inside a diagonal band.
+
+    Returns (matches, exact): matches[i] is the target index aligned to source[i] (None if
+    source[i] was inserted), exact[i] tells whether the normalized tokens were equal.
+
+    Row i only covers target columns within the band around the scaled diagonal i * m / n,
+    and only one score row plus a byte of backpointer per band cell is kept, so memory grows
+    linearly with the input. Horizontal moves inside a row are resolved in one vectorized
+    step: with unit gap cost, D[j] = min_k(C[k] + j - k) = j + cummin(C - index)[j].
+
+    The band is widened by the length difference, which is how far one contiguous dropped
+    or hallucinated span pushes the path off the diagonal. Any path leaving a band of
+    half-width w costs at least w - |n - m| gaps, so a cheaper banded result is optimal.
+    A dearer one is only suspect when the path ran along the band edge or lost sync, which
+    shows up as a long run of substitutions (e.g. spans in opposite directions); then the
+    band is doubled and the alignment redone.
+    """
+    n, m = len(source), len(target)
+    if n == 0:
+        return [], []
+    if m == 0:
+        return [None] * n, [False] * n
+    a, b = token_ids(source, target)
+    # Wide enough that consecutive rows' bands always touch, whatever the length ratio.
+    width = max(band, -(-m // n) + 1) + abs(n - m)
+    while True:
+        matches, exact, cost, on_edge = _banded_alignment(a, b, width)
+        if cost < width - abs(n - m) or width >= max(n, m):
+            return matches, exact
+        if not on_edge and _longest_substitution_run(matches, exact) < band // 2:
+            return matches, exact
+        width *= 2
+
+def attach_timestamps(words, transcript, band: int = DEFAULT_BAND):
+    """Give every word a start/end from the transcript.
+
+    Exact matches are marked verified. Substituted words keep their partner's times
+    unverified, and inserted words get the gap between their aligned neighbours.
+    """
+    matches, exact = align_tokens(words, [w["text"] for w in transcript], band)
+    previous_end, next_start = [None] * len(words), [None] * len(words)
+    last = None
+    for k, match in enumerate(matches):
+        previous_end[k] = last
+        if match is not None:
+            last = transcript[match]["end"]
+    last = None
+    for k in range(len(words) - 1, -1, -1):
+        next_start[k] = last
+        if matches[k] is not None:
+            last = transcript[matches[k]]["start"]
+
+    timed = []
+    for k, (word, match) in enumerate(zip(words, matches)):
+        if match is not None:
+            source = transcript[match]
+            timed.append({"text": word, "start": source["start"], "end": source["end"], "verified": exact[k]})
+            continue
+        before, after = previous_end[k], next_start[k]
+        start = before if before is not None else after if after is not None else 0
+        end = after if after is not None else start
+        timed.append({"text": word, "start": start, "end": max(start, end), "verified": False})
+    return timed
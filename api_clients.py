@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import time
+
+import httpx
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from rate_limiter import retry_with_backoff
+
+load_dotenv()
+
+# Base URLs can point at a local stand-in server for tests.
+ASSEMBLYAI_BASE_URL = os.getenv("ASSEMBLYAI_BASE_URL", "https://api.assemblyai.com/v2").rstrip("/")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+CONNECT_TIMEOUT = float(os.getenv("CAPLY_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("CAPLY_READ_TIMEOUT", "120"))
+POOL_SIZE = 32
+
+class RequestMetrics:
+    """Per-endpoint call counts, latency, bytes on the wire and LLM token usage."""
+
+    FIELDS = ("calls", "errors", "seconds", "bytes_sent", "bytes_received", "prompt_tokens", "completion_tokens")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, endpoint: str, seconds: float, bytes_sent: int = 0, bytes_received: int = 0,
+               prompt_tokens: int = 0, completion_tokens: int = 0, error: bool = False):
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, dict.fromkeys(self.FIELDS, 0))
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["seconds"] += seconds
+            stats["bytes_sent"] += bytes_sent
+            stats["bytes_received"] += bytes_received
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {endpoint: dict(stats) for endpoint, stats in self.endpoints.items()}
+
+    def report(self):
+        endpoints = self.snapshot()
+        if not endpoints:
+            return
+        print(" API requests:")
+        for endpoint, s in sorted(endpoints.items()):
+            mean_ms = 1000 * s["seconds"] / s["calls"]
+            line = (f"  → {endpoint}: {s['calls']} calls ({s['errors']} errors), {mean_ms:.0f} ms avg, "
+                    f"{s['bytes_sent'] / 1024:.1f} KiB sent, {s['bytes_received'] / 1024:.1f} KiB received")
+            if s["prompt_tokens"] or s["completion_tokens"]:
+                line += f", {s['prompt_tokens']} prompt + {s['completion_tokens']} completion tokens"
+            print(line)
+
+_metrics = RequestMetrics()
+
+def get_metrics() -> RequestMetrics:
+    return _metrics
+
+def poll_with_backoff(check, initial_interval: float = 1.0, max_interval: float = 15.0, factor: float = 1.5,
+                      timeout: float = 1800.0, description: str = "operation"):
+    """Call check() until it returns something other than None, sleeping longer between tries."""
+    deadline = time.monotonic() + timeout
+    interval = initial_interval
+    while True:
+        result = check()
+        if result is not None:
+            return result
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"{description} did not finish within {timeout:g}s")
+        time.sleep(min(interval, remaining))
+        interval = min(max_interval, interval * factor)
+
+def is_retryable_http(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or (status is not None and status >= 500)
+
+def is_retryable(error):
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status == 429 or (status is not None and status >= 500)
+
+_session = None
+_openai_client = None
+_client_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """One keep-alive connection pool shared by every plain HTTP call."""
+    global _session
+    with _client_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def get_openai_client() -> openai.Client:
+    # Built on first use so importing a stage never needs credentials. Retries are
+    # left to retry_with_backoff so rate-limit headers can feed the caller's limiter.
+    global _openai_client
+    with _client_lock:
+        if _openai_client is None:
+            http_client = httpx.Client(
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            )
+            _openai_client = openai.Client(
+                api_key=os.getenv("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL, max_retries=0, http_client=http_client
+            )
+        return _openai_client
+
+def chat_completion(model: str, messages, params: dict = None, limiter=None, endpoint: str = "openai.chat") -> str:
+    """One chat completion with rate-limit feedback, retries and metrics; returns the message text."""
+    client = get_openai_client()
+    bytes_sent = len(json.dumps(messages).encode("utf-8"))
+
+    def call():
+        if limiter is not None:
+            limiter.acquire()
+        started = time.perf_counter()
+        try:
+            raw_response = client.chat.completions.with_raw_response.create(
+                model=model, messages=messages, **(params or {})
+            )
+        except Exception:
+            get_metrics().record(endpoint, time.perf_counter() - started, bytes_sent, error=True)
+            raise
+        if limiter is not None:
+            limiter.update_from_headers(raw_response.headers)
+        completion = raw_response.parse()
+        usage = completion.usage
+        get_metrics().record(
+            endpoint, time.perf_counter() - started, bytes_sent, len(raw_response.content),
+            usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0
+        )
+        return completion.choices[0].message.content
+
+    return retry_with_backoff(call, is_retryable, limiter=limiter)
+
+class _CountingReader:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.count = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.count += len(chunk)
+            yield chunk
+
+class AssemblyAIClient:
+    def __init__(self, api_key: str = None, base_url: str = ASSEMBLYAI_BASE_URL,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+        self.api_key = api_key or os.getenv("ASSEMBLYAI_API_KEY")
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, endpoint: str, retry: bool = True, **kwargs) -> requests.Response:
+        headers = {"authorization": self.api_key, **kwargs.pop("headers", {})}
+
+        def call():
+            data = kwargs.get("data")
+            counter = _CountingReader(data) if data is not None and not isinstance(data, (bytes, str)) else None
+            request_kwargs = dict(kwargs, data=counter) if counter is not None else kwargs
+            started = time.perf_counter()
+            try:
+                response = get_session().request(method, self.base_url + path, headers=headers,
+                                                 timeout=self.timeout, **request_kwargs)
+                response.raise_for_status()
+            except Exception:
+                get_metrics().record(endpoint, time.perf_counter() - started, error=True)
+                raise
+            sent = counter.count if counter is not None else len(response.request.body or b"")
+            get_metrics().record(endpoint, time.perf_counter() - started, sent, len(response.content))
+            return response
+
+        # A streamed upload body cannot be replayed, so uploads are not retried here.
+        return retry_with_backoff(call, is_retryable_http) if retry else call()
+
+    def upload(self, chunks) -> str:
+        response = self._request("POST", "/upload", "assemblyai.upload", retry=False,
+                                 headers={"transfer-encoding": "chunked"}, data=chunks)
+        return response.json()["upload_url"]
+
+    def submit(self, audio_url: str, params: dict = None) -> str:
+        response = self._request("POST", "/transcript", "assemblyai.submit",
+                                 json={"audio_url": audio_url, **(params or {})})
+        return response.json()["id"]
+
+    def get_transcript(self, transcript_id: str) -> dict:
+        return self._request("GET", f"/transcript/{transcript_id}", "assemblyai.poll").json()
+
+    def wait_for_transcript(self, transcript_id: str, timeout: float = 1800.0, initial_interval: float = 1.0,
+                            max_interval: float = 15.0) -> dict:
+        def check():
+            transcript = self.get_transcript(transcript_id)
+            if transcript["status"] == "completed":
+                return transcript
+            if transcript["status"] == "error":
+                raise Exception(f"Transcription failed: {transcript['error']}")
+            return None
+
+        return poll_with_backoff(check, initial_interval, max_interval, timeout=timeout,
+                                 description=f"Transcript {transcript_id}")
+
+_assemblyai = None
+
+def get_assemblyai() -> AssemblyAIClient:
+    global _assemblyai
+    with _client_lock:
+        if _assemblyai is None:
+            _assemblyai = AssemblyAIClient()
+        return _assemblyai
@@ -0,0 +1,138 @@
+import os
+
+import numpy as np
+
+try:
+    import librosa
+except ImportError:
+    librosa = None
+
+FEATURES = ("rms", "flux", "pitch")
+
+class AudioFeatureIndex:
+    """Prefix sums over hop-level audio features, filled block by block while decoding.
+
+    Energy for any [start_ms, end_ms) interval is two lookups in the cumulative sum of
+    squared samples. With ``prosody=True`` librosa frame-level RMS, spectral flux and
+    pitch are accumulated the same way and can be averaged over intervals in O(1).
+    """
+
+    def __init__(self, sample_rate: int = 16000, hop_size: int = 160, frame_length: int = 1024, prosody: bool = False):
+        if prosody and librosa is None:
+            raise ImportError("librosa is required for prosody features")
+        self.sample_rate = sample_rate
+        self.hop_size = hop_size
+        self.frame_length = frame_length
+        self.prosody = prosody
+        self._hop_sums = []
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._last_magnitude = None
+        self._frames = {name: [] for name in FEATURES}
+        self.cumulative = {}
+
+    @property
+    def hops_per_ms(self) -> float:
+        return self.sample_rate / self.hop_size / 1000.0
+
+    def update(self, block: np.ndarray):
+        samples = np.concatenate([self._tail, block])
+        usable = len(samples) // self.hop_size * self.hop_size
+        squared = np.square(samples[:usable], dtype=np.float64)
+        self._hop_sums.append(squared.reshape(-1, self.hop_size).sum(axis=1))
+        self._tail = samples[usable:]
+
+        if self.prosody:
+            self._update_prosody(block)
+
+    def _update_prosody(self, block: np.ndarray):
+        buffer = np.concatenate([self._carry, block])
+        if len(buffer) < self.frame_length:
+            self._carry = buffer
+            return
+        n_frames = 1 + (len(buffer) - self.frame_length) // self.hop_size
+        framed = buffer[:(n_frames - 1) * self.hop_size + self.frame_length]
+        self._carry = buffer[n_frames * self.hop_size:]
+
+        rms = librosa.feature.rms(y=framed, frame_length=self.frame_length, hop_length=self.hop_size, center=False)[0]
+        magnitude = np.abs(librosa.stft(framed, n_fft=self.frame_length, hop_length=self.hop_size, center=False))
+        previous = magnitude[:, :1] if self._last_magnitude is None else self._last_magnitude
+        flux = np.maximum(np.diff(np.hstack([previous, magnitude]), axis=1), 0).sum(axis=0)
+        self._last_magnitude = magnitude[:, -1:]
+        pitch = librosa.yin(framed, fmin=65, fmax=600, sr=self.sample_rate,
+                            frame_length=self.frame_length, hop_length=self.hop_size, center=False)
+
+        self._frames["rms"].append(rms)
+        self._frames["flux"].append(flux)
+        self._frames["pitch"].append(pitch)
+
+    def finalize(self) -> "AudioFeatureIndex":
+        if len(self._tail):
+            self._hop_sums.append(np.array([np.square(self._tail, dtype=np.float64).sum()]))
+            self._tail = np.zeros(0, dtype=np.float32)
+        hop_sums = np.concatenate(self._hop_sums) if self._hop_sums else np.zeros(0)
+        self.cumulative["energy"] = np.concatenate([[0.0], np.cumsum(hop_sums)])
+        for name in FEATURES:
+            if self._frames[name]:
+                values = np.concatenate(self._frames[name]).astype(np.float64)
+                self.cumulative[name] = np.concatenate([[0.0], np.cumsum(values)])
+        self._hop_sums = []
+        self._frames = {name: [] for name in FEATURES}
+        return self
+
+    def _bounds(self, name, start_ms, end_ms):
+        n = len(self.cumulative[name]) - 1
+        start = np.clip((np.asarray(start_ms, dtype=np.float64) * self.hops_per_ms).astype(np.int64), 0, n)
+        end = np.clip(np.ceil(np.asarray(end_ms, dtype=np.float64) * self.hops_per_ms).astype(np.int64), 0, n)
+        return start, np.maximum(end, start)
+
+    def energy(self, start_ms, end_ms) -> np.ndarray:
+        start, end = self._bounds("energy", start_ms, end_ms)
+        cs = self.cumulative["energy"]
+        count = (end - start) * self.hop_size
+        total = cs[end] - cs[start]
+        return np.sqrt(np.divide(total, count, out=np.zeros_like(total), where=count > 0))
+
+    def mean(self, name, start_ms, end_ms) -> np.ndarray:
+        if name not in self.cumulative:
+            raise KeyError(f"Feature '{name}' was not computed")
+        start, end = self._bounds(name, start_ms, end_ms)
+        cs = self.cumulative[name]
+        count = (end - start).astype(np.float64)
+        total = cs[end] - cs[start]
+        return np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+
+    def score_words(self, words):
+        if not words:
+            return words
+        starts = np.fromiter((w["start"] for w in words), dtype=np.float64, count=len(words))
+        ends = np.fromiter((w["end"] for w in words), dtype=np.float64, count=len(words))
+
+        columns = {"energy": self.energy(starts, ends)}
+        for name in FEATURES:
+            if name in self.cumulative:
+                columns[name] = self.mean(name, starts, ends)
+
+        for i, word in enumerate(words):
+            for name, values in columns.items():
+                word[name] = float(values[i])
+        return words
+
+    def save(self, path: str):
+        np.savez_compressed(path, sample_rate=self.sample_rate, hop_size=self.hop_size,
+                            frame_length=self.frame_length, **self.cumulative)
+
+    @classmethod
+    def load(cls, path: str) -> "AudioFeatureIndex":
+        with np.load(path) as data:
+            index = cls(int(data["sample_rate"]), int(data["hop_size"]), int(data["frame_length"]))
+            index.cumulative = {name: data[name] for name in ("energy",) + FEATURES if name in data}
+        return index
+
+def features_path(transcription_path: str) -> str:
+    return os.path.splitext(transcription_path)[0] + "_features.npz"
+
+def load_features(transcription_path: str):
+    """The index saved next to a transcription, or None for transcriptions made without one."""
+    path = features_path(transcription_path)
+    return AudioFeatureIndex.load(path) if os.path.exists(path) else None
@@ -0,0 +1,196 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from script1_transcription import transcribe_videos
+from script2_extract_frames import extract_caption_events
+from script3_style_detection import analyze_frames, analyze_video
+from script4_filter_frames import filter_duplicate_frames
+from script5_chunk_transcription import chunk_transcription
+from script6_style_templates import extract_styles
+from script7_generate_ass import generate_ass_file
+from render_captions import burn_subtitles
+from response_cache import hash_file
+from style_packs import get_store, materialize
+from pipeline import FingerprintStore, Stage, run_pipeline
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".mkv", ".webm")
+FRAME_STYLE_PROMPT = os.path.join("prompts", "frame_style_prompt.txt")
+
+def build_style_profile(reference_video: str, work_dir: str, reanalyze: bool = False, stream: bool = False) -> str:
+    """Return the style pack path for reference_video, analyzing it (stages 2, 3, 4 and 6) only if no pack exists."""
+    store = get_store()
+    reference_hash = hash_file(reference_video)
+    pack_path = None if reanalyze else store.find(reference_video, reference_hash)
+    if pack_path:
+        print(f" Using stored style pack {reference_hash[:12]} for {reference_video}")
+        return pack_path
+
+    frames_dir = os.path.join(work_dir, "frames")
+    all_frames = os.path.join(work_dir, "all_frames.json")
+    filtered_frames = os.path.join(work_dir, "filtered_all_frames.json")
+    templates = os.path.join(work_dir, "templates.json")
+    style_seq = os.path.join(work_dir, "style_sequence_by_frame.json")
+    analysis_kwargs = {"max_frames": 85, "concurrency": 8, "batch_size": 4}
+    if stream:
+        frame_stages = [
+            Stage("stream_frames", analyze_video, [reference_video, FRAME_STYLE_PROMPT], [frames_dir, all_frames],
+                  args=(reference_video, all_frames),
+                  kwargs={"frames_dir": frames_dir, "coarse_fps": 2, **analysis_kwargs},
+                  description="Sampling and analyzing caption events from reference video"),
+        ]
+    else:
+        frame_stages = [
+            Stage("sample_frames", extract_caption_events, [reference_video], [frames_dir],
+                  args=(reference_video, frames_dir), kwargs={"coarse_fps": 2},
+                  description="Sampling caption events from reference video"),
+            Stage("analyze_frames", analyze_frames, [frames_dir, FRAME_STYLE_PROMPT], [all_frames],
+                  args=(frames_dir, all_frames), kwargs=analysis_kwargs,
+                  description="Analyzing frames for subtitle style detection"),
+        ]
+    stages = frame_stages + [
+        Stage("filter_frames", filter_duplicate_frames, [all_frames], [filtered_frames],
+              args=(all_frames, filtered_frames), description="Filtering duplicate frames"),
+        Stage("styles", extract_styles, [filtered_frames], [templates, style_seq],
+              args=(filtered_frames, templates, style_seq), description="Extracting styles and mapping sequences"),
+    ]
+    run_pipeline(stages, store=FingerprintStore(os.path.join(work_dir, ".stage_fingerprints.json")))
+    return store.save(reference_video, filtered_frames, templates, style_seq)
+
+def transcript_path(output_dir: str) -> str:
+    return os.path.join(output_dir, "transcription_with_energy.json")
+
+def process_clip(clip_path: str, profile: dict, output_dir: str, chunk_mode: str = "auto",
+                 burn: bool = True, render_workers: int = 1) -> dict:
+    """Chunk, style and burn one transcribed clip against the shared read-only reference profile."""
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    transcript = transcript_path(output_dir)
+    chunks = os.path.join(output_dir, "chunks.json")
+    ass_path = os.path.join(output_dir, "styled_output.ass")
+    video_path = os.path.join(output_dir, Path(clip_path).stem + "_captioned.mp4")
+
+    chunk_transcription(transcript, profile["filtered_frames"], chunks, mode=chunk_mode)
+    generate_ass_file(chunks, profile["style_sequence"], profile["templates"], ass_path,
+                      os.path.join(output_dir, "logs.txt"))
+    if burn:
+        burn_subtitles(clip_path, ass_path, video_path, workers=render_workers)
+    return {
+        "clip": clip_path,
+        "ass": ass_path,
+        "video": video_path if burn else None,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+def clip_output_dirs(clips, output_root: str):
+    """One output directory per clip, mirroring the clip paths below their common folder.
+
+    a/x.mp4 and b/x.mp4 therefore land in a/x and b/x; clips that differ only in
+    extension also get the extension in their directory name.
+    """
+    paths = [os.path.abspath(clip) for clip in clips]
+    if not paths:
+        return []
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    relative = [os.path.splitext(os.path.relpath(path, root)) for path in paths]
+    counts = Counter(stem for stem, _ in relative)
+    return [
+        os.path.join(output_root, stem + (extension.replace(".", "_") if counts[stem] > 1 else ""))
+        for stem, extension in relative
+    ]
+
+def _run_clip(args):
+    # Runs in a worker process; failures come back as data so one bad clip never stops the batch.
+    clip_path = args[0]
+    try:
+        return process_clip(*args)
+    except Exception as e:
+        return {"clip": clip_path, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+
+def run_batch(reference_video: str, clips, output_root: str = "batch_output", workers: int = None,
+              chunk_mode: str = "auto", burn: bool = True, reanalyze: bool = False, stream: bool = False,
+              prosody: bool = False):
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    render_workers = max(1, (os.cpu_count() or 2) // workers)
+
+    pack_path = build_style_profile(reference_video, os.path.join(output_root, "_reference_work"), reanalyze, stream)
+    # Materialize once; every worker then only reads these files.
+    reference_dir = os.path.join(output_root, "_reference")
+    profile = {
+        "filtered_frames": os.path.join(reference_dir, "filtered_all_frames.json"),
+        "templates": os.path.join(reference_dir, "templates.json"),
+        "style_sequence": os.path.join(reference_dir, "style_sequence_by_frame.json"),
+    }
+    video_hash = Path(pack_path).name.split(".")[0]
+    materialize(get_store().load(video_hash), profile["filtered_frames"], profile["templates"], profile["style_sequence"])
+
+    # All clips are uploaded and polled together from this process before the workers start.
+    output_dirs = clip_output_dirs(clips, output_root)
+    print(f"\n Transcribing {len(clips)} clips")
+    pairs = [(clip, transcript_path(output_dir)) for clip, output_dir in zip(clips, output_dirs)]
+    transcribed = transcribe_videos(pairs, prosody, return_exceptions=True)
+
+    jobs, results, failures = [], [], []
+    for clip, output_dir, words in zip(clips, output_dirs, transcribed):
+        if isinstance(words, Exception):
+            failures.append({"clip": clip, "error": f"{type(words).__name__}: {words}"})
+            print(f" ✖ {clip}: transcription failed: {failures[-1]['error']}")
+        else:
+            jobs.append((clip, profile, output_dir, chunk_mode, burn, render_workers))
+
+    print(f"\n Captioning {len(jobs)} clips with {workers} worker processes")
+    # Spawned workers start clean: a forked child would inherit the parent's SQLite cache
+    # connection and pooled HTTP clients, which are not safe to share across processes.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(_run_clip, job) for job in jobs]
+        for n, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            if "error" in result:
+                failures.append(result)
+                print(f" [{n}/{len(jobs)}] ✖ {result['clip']}: {result['error']}")
+            else:
+                results.append(result)
+                print(f" [{n}/{len(jobs)}] ✔ {result['clip']} ({result['seconds']:.1f}s)")
+
+    report_path = os.path.join(output_root, "batch_report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"reference": reference_video, "pack": pack_path, "succeeded": results, "failed": failures},
+                  f, indent=2, ensure_ascii=False)
+    print(f"\n Batch complete: {len(results)} succeeded, {len(failures)} failed. Report: {report_path}")
+    return results, failures
+
+def collect_clips(paths):
+    clips = []
+    for path in paths:
+        if os.path.isdir(path):
+            clips.extend(sorted(p for p in glob.glob(os.path.join(path, "*")) if p.lower().endswith(VIDEO_EXTENSIONS)))
+        else:
+            clips.append(path)
+    return clips
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply one reference caption style to many input clips.")
+    parser.add_argument("reference", help="reference video whose caption style is copied")
+    parser.add_argument("clips", nargs="+", help="input clips or directories of clips")
+    parser.add_argument("--output", default="batch_output")
+    parser.add_argument("--workers", type=int, default=None, help="clip worker processes")
+    parser.add_argument("--chunk-mode", default="auto", choices=["auto", "windowed", "local", "hybrid", "single"])
+    parser.add_argument("--no-burn", action="store_true", help="stop after writing each clip's .ass file")
+    parser.add_argument("--reanalyze", action="store_true",
+                        help="analyze the reference video even if a stored style pack matches it")
+    parser.add_argument("--stream", action="store_true",
+                        help="analyze caption events while the reference video is still being decoded")
+    parser.add_argument("--prosody", action="store_true",
+                        help="also extract RMS, spectral flux and pitch (needs librosa) to help place chunk breaks")
+    cli = parser.parse_args()
+
+    _, failed = run_batch(cli.reference, collect_clips(cli.clips), cli.output, cli.workers,
+                          cli.chunk_mode, not cli.no_burn, cli.reanalyze, cli.stream, cli.prosody)
+    raise SystemExit(1 if failed else 0)
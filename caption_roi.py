@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+
+ANALYSIS_WIDTH = 320
+
+def _load_gray(path, width=ANALYSIS_WIDTH):
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f"Unable to read image: {path}")
+    return _downscale_gray(image, width)
+
+def _pad_box(x0, y0, x1, y1, shape, pad):
+    height, width = shape[:2]
+    pad_x, pad_y = int(width * pad), int(height * pad)
+    x0, y0 = max(0, x0 - pad_x), max(0, y0 - pad_y)
+    x1, y1 = min(width, x1 + pad_x), min(height, y1 + pad_y)
+    return int(x0), int(y0), int(x1 - x0), int(y1 - y0)
+
+def _downscale_gray(image, width=ANALYSIS_WIDTH):
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    scale = width / image.shape[1]
+    small = cv2.resize(image, (width, max(1, int(image.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+    return small, scale, image.shape
+
+def roi_from_frames(grays, scale, shape, pad: float = 0.03):
+    if not grays:
+        return None
+    edges = np.stack([cv2.Canny(gray, 100, 200) > 0 for gray in grays]).astype(np.float32)
+
+    # Captions flicker on and off at the same place; static graphics have no variance
+    # and moving backgrounds have low edge density.
+    score = edges.std(axis=0) * edges.mean(axis=0)
+    if not score.any():
+        return None
+    mask = (score > score.mean() + 2 * score.std()).astype(np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (25, 9)))
+
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask)
+    if count <= 1:
+        return None
+    largest = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    x, y, w, h = stats[largest, :4]
+    box = np.array([x, y, x + w, y + h]) / scale
+    return _pad_box(*box.astype(int), shape, pad)
+
+def detect_caption_roi(frame_paths, sample: int = 40, pad: float = 0.03):
+    """Find the caption band from where text edges appear and disappear over time.
+
+    Returns (x, y, w, h) in full-resolution pixels, or None if no stable region is found.
+    """
+    if not frame_paths:
+        return None
+    picks = np.linspace(0, len(frame_paths) - 1, min(sample, len(frame_paths))).astype(int)
+    grays = []
+    scale, shape = 1.0, None
+    for i in picks:
+        try:
+            gray, scale, shape = _load_gray(frame_paths[i])
+        except ValueError:
+            continue  # an unreadable sample just leaves one fewer frame to vote
+        grays.append(gray)
+    return roi_from_frames(grays, scale, shape, pad)
+
+def detect_caption_roi_in_video(video_path: str, sample: int = 40, pad: float = 0.03):
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    grays = []
+    scale, shape = 1.0, None
+    for index in np.linspace(0, max(0, frame_count - 1), min(sample, max(1, frame_count))).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ret, frame = cap.read()
+        if not ret:
+            continue
+        gray, scale, shape = _downscale_gray(frame)
+        grays.append(gray)
+    cap.release()
+    return roi_from_frames(grays, scale, shape, pad)
+
+def crop_and_encode(image, roi=None, max_width: int = 768, quality: int = 85):
+    """Crop to the caption ROI, downscale to max_width and JPEG-encode in memory.
+
+    Returns (jpeg_bytes, scale) where scale maps crop pixels back to source pixels.
+    """
+    if roi is not None:
+        x, y, w, h = roi
+        image = image[y:y + h, x:x + w]
+    scale = 1.0
+    if image.shape[1] > max_width:
+        scale = max_width / image.shape[1]
+        image = cv2.resize(image, (max_width, max(1, int(image.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buffer.tobytes(), scale
@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+
+def crop_roi(image, roi=None):
+    if roi is None:
+        return image
+    x, y, w, h = roi
+    return image[y:y + h, x:x + w]
+
+def caption_hash(image, roi=None, hash_size: int = 16) -> np.ndarray:
+    # Difference hash of the caption area: one bit per horizontal gradient sign.
+    region = crop_roi(image, roi)
+    if region.ndim == 3:
+        region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(region, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return (small[:, 1:] > small[:, :-1]).ravel()
+
+def dhash_file(path: str, roi=None, hash_size: int = 16) -> np.ndarray:
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f"Unable to read image: {path}")
+    return caption_hash(image, roi, hash_size)
+
+class CaptionGrouper:
+    """group_by_caption one frame at a time, for frames that arrive as they are decoded."""
+
+    def __init__(self, threshold: int = 3):
+        self.threshold = threshold
+        self.count = 0
+        self.last = None
+
+    def add(self, h) -> int:
+        """Return the index of the earlier frame whose caption this one repeats, or its own index.
+
+        A frame without a hash (None, e.g. unreadable) stands alone and never matches.
+        """
+        i = self.count
+        self.count += 1
+        if h is None:
+            return i
+        if self.last is not None and np.count_nonzero(h != self.last[1]) <= self.threshold:
+            return self.last[0]
+        self.last = (i, h)
+        return i
+
+def group_by_caption(hashes, threshold: int = 3):
+    """Map each frame index to the index of the earlier frame whose caption it repeats."""
+    grouper = CaptionGrouper(threshold)
+    return [grouper.add(h) for h in hashes]
+
+def dedup_report(total: int, sent: int) -> str:
+    avoided = total - sent
+    share = (avoided / total * 100) if total else 0.0
+    return f" Vision calls: {sent}/{total} frames sent, {avoided} avoided ({share:.0f}%)"
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import threading
+
+def journal_path(output_path: str) -> str:
+    root, _ = os.path.splitext(output_path)
+    return root + ".journal.jsonl"
+
+def frame_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+class FrameJournal:
+    """Append-only JSONL log of per-frame analysis results.
+
+    Every line is {"frame", "sha256", "status", ...}; the last line for a frame wins. A
+    result only counts on resume if the frame file still has the same sha256, so a
+    re-sampled frames folder never reuses stale styles.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a torn last line from an interrupted write
+                    self.entries[entry["frame"]] = entry
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def completed(self, frame: str, digest: str):
+        entry = self.entries.get(frame)
+        if entry and entry["status"] == "ok" and entry["sha256"] == digest:
+            return entry["words"]
+        return None
+
+    def _append(self, entry: dict):
+        with self.lock:
+            self.entries[entry["frame"]] = entry
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def record(self, frame: str, digest: str, words):
+        self._append({"frame": frame, "sha256": digest, "status": "ok", "words": words})
+
+    def record_error(self, frame: str, digest: str, error: Exception):
+        self._append({"frame": frame, "sha256": digest, "status": "error", "error": str(error)})
+
+    def failed(self):
+        return sorted(name for name, entry in self.entries.items() if entry["status"] == "error")
+
+    def compact(self):
+        """Rewrite the journal with only the latest entry per frame."""
+        with self.lock:
+            self.file.close()
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+            self.file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
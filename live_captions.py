@@ -0,0 +1,172 @@
+import argparse
+import io
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+from api_clients import get_assemblyai
+from audio_features import AudioFeatureIndex
+from local_chunker import build_chunks, chunk_boundaries
+from response_cache import hash_file
+from script1_transcription import HOP_SIZE, SAMPLE_RATE, TRANSCRIPT_PARAMS, stream_pcm
+from script7_generate_ass import ass_header, build_style_index, dialogue_line, style_chunk
+from style_packs import get_store, resolve_hash
+
+WINDOW_SECONDS = 10.0
+OVERLAP_SECONDS = 2.0
+
+def iter_windows(input_path: str, window_seconds: float = WINDOW_SECONDS, overlap_seconds: float = OVERLAP_SECONDS,
+                 sample_rate: int = SAMPLE_RATE):
+    """Yield (start_ms, samples) windows of window_seconds new audio plus overlap_seconds of the previous tail.
+
+    One preallocated buffer is reused, so memory stays the same however long the input runs.
+    """
+    window = int(window_seconds * sample_rate)
+    overlap = int(overlap_seconds * sample_rate)
+    buffer = np.zeros(overlap + window, dtype=np.float32)
+    tail, filled, position = 0, 0, 0  # position: absolute sample index of buffer[tail]
+
+    for block in stream_pcm(input_path, sample_rate):
+        while len(block):
+            take = min(window - filled, len(block))
+            buffer[tail + filled:tail + filled + take] = block[:take]
+            filled += take
+            block = block[take:]
+            if filled == window:
+                yield (position - tail) * 1000 // sample_rate, buffer[:tail + filled].copy()
+                keep = min(overlap, tail + filled)
+                buffer[:keep] = buffer[tail + filled - keep:tail + filled]
+                position += filled
+                tail, filled = keep, 0
+    if filled:
+        yield (position - tail) * 1000 // sample_rate, buffer[:tail + filled].copy()
+
+def transcribe_window(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, timeout: float = 120.0):
+    audio = io.BytesIO()
+    sf.write(audio, samples, sample_rate, format="FLAC", subtype="PCM_16")
+    client = get_assemblyai()
+    transcript_id = client.submit(client.upload([audio.getvalue()]), TRANSCRIPT_PARAMS)
+    # Short windows finish quickly, so poll tightly to keep latency down.
+    return client.wait_for_transcript(transcript_id, timeout=timeout, initial_interval=0.3, max_interval=2.0)["words"]
+
+def analyze_window(start_ms: int, samples: np.ndarray, sample_rate: int = SAMPLE_RATE):
+    words = transcribe_window(samples, sample_rate) or []
+    index = AudioFeatureIndex(sample_rate, HOP_SIZE)
+    index.update(samples)
+    index.finalize()
+    scored = index.score_words(words)
+    for word in scored:
+        word["start"] += start_ms
+        word["end"] += start_ms
+    return scored
+
+class RollingAss:
+    """Styles chunks with a stored reference pack and appends them to an .ass file as they arrive."""
+
+    def __init__(self, pack: dict, output_path: str, fallback: str = "nearest"):
+        self.style_seq = pack["style_sequence"]
+        self.template_lookup = {t["name"]: t for t in pack["templates"]}
+        self.style_index = build_style_index(self.style_seq)
+        # The reference is short; live timestamps cycle through its caption timeline.
+        self.span = max((data["time_ms"] for data in self.style_seq.values()), default=0) + 1
+        self.fallback = fallback
+        self.file = open(output_path, "w", encoding="utf-8")
+        self.file.write(ass_header(pack["templates"]))
+        self.file.flush()
+        self.events = 0
+
+    def write(self, chunks):
+        for chunk in chunks:
+            words = chunk["words"]
+            avg_time = (chunk["start_time"] + chunk["end_time"]) // 2
+            matched = style_chunk(self.style_index, self.style_seq, self.template_lookup, avg_time % self.span,
+                                  len(words), self.fallback)
+            if not matched:
+                print(f"⚠️ Skipping chunk: {chunk['chunk_text']}")
+                continue
+            _, _, styles, positions = matched
+            self.file.write(dialogue_line(chunk["start_time"], chunk["end_time"], words, styles, positions,
+                                          self.template_lookup))
+            self.events += 1
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def caption_stream(input_path: str, pack: dict, output_path: str, window_seconds: float = WINDOW_SECONDS,
+                   overlap_seconds: float = OVERLAP_SECONDS, max_words: int = None, max_pending: int = 2):
+    """Caption a file or pipe window by window, appending Dialogue lines as each window is transcribed.
+
+    Each window keeps the words that start in its own half of the overlaps, so a word cut
+    at one window edge is taken whole from the neighbouring window. The last chunk is held
+    back until the next window, because its sentence may continue there.
+    """
+    max_words = max_words or pack.get("max_words") or 5
+    half_overlap = int(overlap_seconds * 1000) // 2
+    output = RollingAss(pack, output_path)
+    carry, tail_words = [], []
+    lower = 0
+
+    def commit(window):
+        nonlocal carry, tail_words, lower
+        start_ms, end_ms, queued, future = window
+        upper = end_ms - half_overlap
+        words = future.result()
+        carry += [w for w in words if lower <= w["start"] < upper]
+        tail_words = [w for w in words if w["start"] >= upper]
+        lower = upper
+        emit(final=False)
+        print(f" Window {start_ms / 1000:.1f}-{end_ms / 1000:.1f}s captioned "
+              f"{time.monotonic() - queued:.1f}s after its audio was read")
+
+    def emit(final):
+        nonlocal carry
+        if not carry:
+            return
+        bounds, _ = chunk_boundaries(carry, max_words)
+        ready = bounds if final else bounds[:-1]
+        output.write(build_chunks(carry, ready))
+        carry = carry[ready[-1][1]:] if ready else carry
+
+    in_flight = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_pending)) as pool:
+            for start_ms, samples in iter_windows(input_path, window_seconds, overlap_seconds):
+                end_ms = start_ms + len(samples) * 1000 // SAMPLE_RATE
+                in_flight.append((start_ms, end_ms, time.monotonic(), pool.submit(analyze_window, start_ms, samples)))
+                if len(in_flight) >= max_pending:
+                    commit(in_flight.popleft())
+            while in_flight:
+                commit(in_flight.popleft())
+        carry += tail_words
+        emit(final=True)
+    finally:
+        output.close()
+    print(f" Live captions: {output.events} events written to {output_path}")
+
+def load_pack(pack: str = None, reference: str = None) -> dict:
+    store = get_store()
+    if pack:
+        return store.load(resolve_hash(pack))
+    video_hash = hash_file(reference)
+    if not store.find(reference, video_hash):
+        raise ValueError(f"No style pack for {reference}; run main.py or batch.py on it first")
+    return store.load(video_hash)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Caption audio window by window, appending to a rolling .ass file.")
+    parser.add_argument("input", help="audio/video file, stream URL, or '-' to read from stdin")
+    parser.add_argument("output", help=".ass file to append captions to")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pack", help="stored style pack hash or unique prefix")
+    source.add_argument("--reference", help="reference video whose stored style pack to use")
+    parser.add_argument("--window", type=float, default=WINDOW_SECONDS, help="seconds of new audio per window")
+    parser.add_argument("--overlap", type=float, default=OVERLAP_SECONDS)
+    parser.add_argument("--max-words", type=int, default=None)
+    cli = parser.parse_args()
+
+    input_path = "pipe:0" if cli.input == "-" else cli.input
+    caption_stream(input_path, load_pack(cli.pack, cli.reference), cli.output, cli.window, cli.overlap, cli.max_words)
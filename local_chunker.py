@@ -0,0 +1,153 @@
+import numpy as np
+
+SENTENCE_END = (".", "?", "!")
+CLAUSE_END = SENTENCE_END + (",", ";", ":")
+
+def word_arrays(words):
+    start = np.fromiter((w["start"] for w in words), dtype=np.int64, count=len(words))
+    end = np.fromiter((w["end"] for w in words), dtype=np.int64, count=len(words))
+    energy = np.fromiter((w.get("energy", 0.0) for w in words), dtype=np.float64, count=len(words))
+    text = np.array([w["text"].strip() for w in words], dtype=str)
+    return start, end, energy, text
+
+def normalize_energy(energy):
+    # Scale so the loud end of this speaker sits near 1, like the 0–1 range the prompt assumes.
+    if not len(energy):
+        return energy
+    top = np.percentile(energy, 95)
+    return np.clip(energy / top, 0.0, 1.0) if top > 0 else np.zeros_like(energy)
+
+def prosody_scores(features, start, end):
+    """Per-gap evidence from the transcription's audio feature index, each in 0..1.
+
+    A gap that is much quieter than the words around it is a real pause even when the
+    timestamps leave it short, and with prosody features a pitch reset after the gap
+    marks the start of a new phrase.
+    """
+    gap_energy = features.energy(end[:-1], np.maximum(start[1:], end[:-1]))
+    word_energy = features.energy(start, end)
+    around = (word_energy[:-1] + word_energy[1:]) / 2
+    quiet = 1.0 - np.clip(np.divide(gap_energy, around, out=np.ones_like(around), where=around > 0), 0.0, 1.0)
+    score = np.where(start[1:] > end[:-1], quiet, 0.0)
+    if "pitch" in features.cumulative:
+        pitch = np.maximum(features.mean("pitch", start, end), 1.0)
+        score += np.clip(np.log(pitch[1:] / pitch[:-1]) / np.log(1.5), 0.0, 1.0)
+    return score
+
+def boundary_scores(words, pause_ms: int = 120, high: float = 0.6, low: float = 0.3, features=None):
+    """Per-gap arrays (length n-1): hard break flags and a soft score for optional cuts.
+
+    features is the transcription's AudioFeatureIndex, if one was saved; it only adds to
+    the soft score, so hard breaks stay the same with or without it.
+    """
+    start, end, energy, text = word_arrays(words)
+    level = normalize_energy(energy)
+    gaps = (start[1:] - end[:-1]).astype(np.float64)
+    punct = np.isin(np.array([t[-1:] for t in text[:-1]], dtype=str), CLAUSE_END)
+    drop = (level[:-1] >= high) & (level[1:] <= low)
+
+    hard = (gaps > pause_ms) | punct | drop
+    soft = np.clip(gaps, 0, None) / pause_ms + np.abs(np.diff(level)) / (high - low)
+    if features is not None and len(words) > 1:
+        soft += prosody_scores(features, start, end)
+    return hard, soft
+
+def split_segment(lo, hi, soft, max_words, min_words):
+    cuts = []
+    pos = lo
+    while hi - pos > max_words:
+        first = pos + min_words
+        last = min(pos + max_words, hi - min_words)
+        if last < first:
+            last = first
+        # soft[i - 1] scores the gap before word i
+        cut = first + int(np.argmax(soft[first - 1:last]))
+        cuts.append(cut)
+        pos = cut
+    return cuts
+
+def merge_single_words(bounds, gaps, sentence_breaks, max_words):
+    # Fold an isolated word into the neighbour across the smaller gap, if that neighbour
+    # has room and no sentence ends between them.
+    bounds = list(bounds)
+    k = 0
+    while k < len(bounds):
+        lo, hi = bounds[k]
+        if hi - lo != 1 or len(bounds) == 1:
+            k += 1
+            continue
+        options = []
+        if k > 0 and bounds[k - 1][1] - bounds[k - 1][0] < max_words and not sentence_breaks[lo - 1]:
+            options.append((gaps[lo - 1], k - 1))
+        if k + 1 < len(bounds) and bounds[k + 1][1] - bounds[k + 1][0] < max_words and not sentence_breaks[hi - 1]:
+            options.append((gaps[hi - 1], k + 1))
+        if not options:
+            k += 1
+            continue
+        _, other = min(options)
+        first, second = sorted([k, other])
+        bounds[first:second + 1] = [(bounds[first][0], bounds[second][1])]
+        k = first
+    return bounds
+
+def chunk_boundaries(words, max_words: int = 5, min_words: int = 2, pause_ms: int = 120, weak_score: float = 0.5,
+                     features=None):
+    """Return (chunk word ranges, ambiguous word ranges).
+
+    A range is ambiguous when it had to be split to fit max_words and at least one
+    forced cut has no real pause or energy change behind it.
+    """
+    if max_words <= 0:
+        raise ValueError(f"max_words must be positive, got {max_words}")
+    n = len(words)
+    if n == 0:
+        return [], []
+    if max_words == 1:
+        return [(i, i + 1) for i in range(n)], []
+    min_words = max(1, min(min_words, max_words))
+    hard, soft = boundary_scores(words, pause_ms, features=features)
+    start, end, _, text = word_arrays(words)
+    gaps = start[1:] - end[:-1]
+    sentence_breaks = np.array([t.endswith(SENTENCE_END) for t in text[:-1]], dtype=bool)
+    breaks = [0] + (np.flatnonzero(hard) + 1).tolist() + [n]
+
+    bounds, ambiguous = [], []
+    for lo, hi in zip(breaks, breaks[1:]):
+        cuts = split_segment(lo, hi, soft, max_words, min_words) if hi - lo > max_words else []
+        if any(soft[cut - 1] < weak_score for cut in cuts):
+            ambiguous.append((lo, hi))
+        edges = [lo] + cuts + [hi]
+        bounds.extend(zip(edges, edges[1:]))
+
+    return merge_single_words(bounds, gaps, sentence_breaks, max_words), ambiguous
+
+def build_chunks(words, bounds):
+    start, end, energy, text = word_arrays(words)
+    level = normalize_energy(energy)
+    chunks = []
+    previous_closed = True
+    for lo, hi in bounds:
+        mean = float(level[lo:hi].mean())
+        closes = text[hi - 1].endswith(SENTENCE_END)
+        if previous_closed and closes:
+            relation = "standalone"
+        elif previous_closed:
+            relation = "start"
+        elif closes:
+            relation = "end"
+        else:
+            relation = "middle"
+        chunks.append({
+            "chunk_text": " ".join(text[lo:hi].tolist()),
+            "start_time": int(start[lo]),
+            "end_time": int(end[hi - 1]),
+            "words": text[lo:hi].tolist(),
+            "mood": "intense" if mean > 0.66 else "calm" if mean < 0.33 else "neutral",
+            "sentence_relation": relation,
+        })
+        previous_closed = closes
+    return chunks
+
+def chunk_locally(words, max_words: int = 5, min_words: int = 2, pause_ms: int = 120, features=None):
+    bounds, _ = chunk_boundaries(words, max_words, min_words, pause_ms, features=features)
+    return build_chunks(words, bounds)
@@ -1,14 +1,20 @@
 import os
+import argparse
 from pathlib import Path
 import json
 
-from script1_transcription import process_video
-from script2_extract_frames import extract_frames
-from script3_style_detection import analyze_frames
+from audio_features import features_path
+from script1_transcription import transcribe_videos
+from script2_extract_frames import extract_caption_events
+from script3_style_detection import analyze_frames, analyze_video
 from script4_filter_frames import filter_duplicate_frames
 from script5_chunk_transcription import chunk_transcription
 from script6_style_templates import extract_styles
 from script7_generate_ass import generate_ass_file
+from api_clients import get_metrics
+from response_cache import get_cache, hash_file
+from style_packs import get_store, load_style_pack, save_style_pack
+from pipeline import FingerprintStore, Stage, run_pipeline
 
 REFERENCE_VIDEO = "videos/mb_ref.mp4"
 INPUT_VIDEO = "videos/mb_1_plain.mp4"
@@ -18,6 +24,7 @@ OUTPUT_DIR = "output"
 
 REF_JSON = os.path.join(DATA_DIR, "ref_transcription_with_energy.json")
 INPUT_JSON = os.path.join(DATA_DIR, "input_transcription_with_energy.json")
+INPUT_FEATURES = features_path(INPUT_JSON)
 ALL_FRAMES_JSON = os.path.join(DATA_DIR, "all_frames.json")
 FILTERED_FRAMES_JSON = os.path.join(OUTPUT_DIR, "filtered_all_frames.json")
 CHUNKS_JSON = os.path.join(OUTPUT_DIR, "chunks.json")
@@ -25,32 +32,107 @@ TEMPLATES_JSON = os.path.join(OUTPUT_DIR, "templates.json")
 STYLE_SEQ_JSON = os.path.join(OUTPUT_DIR, "style_sequence_by_frame.json")
 ASS_OUTPUT = os.path.join(OUTPUT_DIR, "styled_output.ass")
 LOG_OUTPUT = os.path.join(OUTPUT_DIR, "logs.txt")
+FRAME_STYLE_PROMPT = os.path.join("prompts", "frame_style_prompt.txt")
+CHUNKING_PROMPT = os.path.join("prompts", "chunking_prompt.txt")
 
-print("\n[1/7] Transcribing reference and input videos with energy...")
-process_video(REFERENCE_VIDEO, REF_JSON)
-process_video(INPUT_VIDEO, INPUT_JSON)
+ANALYSIS_KWARGS = {"max_frames": 85, "concurrency": 8, "batch_size": 4}
 
-print("\n[2/7] Extracting frames from reference video...")
-extract_frames(REFERENCE_VIDEO, FRAMES_DIR, target_fps=2)
+def frame_stages(stream: bool = False):
+    if stream:
+        # One stage: caption events go straight from the decoder to the analysis workers.
+        return [
+            Stage("stream_frames", analyze_video, [REFERENCE_VIDEO, FRAME_STYLE_PROMPT], [FRAMES_DIR, ALL_FRAMES_JSON],
+                  args=(REFERENCE_VIDEO, ALL_FRAMES_JSON),
+                  kwargs={"frames_dir": FRAMES_DIR, "coarse_fps": 2, **ANALYSIS_KWARGS},
+                  description="Sampling and analyzing caption events from reference video"),
+        ]
+    return [
+        Stage("sample_frames", extract_caption_events, [REFERENCE_VIDEO], [FRAMES_DIR],
+              args=(REFERENCE_VIDEO, FRAMES_DIR), kwargs={"coarse_fps": 2},
+              description="Sampling caption events from reference video"),
+        Stage("analyze_frames", analyze_frames, [FRAMES_DIR, FRAME_STYLE_PROMPT], [ALL_FRAMES_JSON],
+              args=(FRAMES_DIR, ALL_FRAMES_JSON), kwargs=ANALYSIS_KWARGS,
+              description="Analyzing frames for subtitle style detection"),
+    ]
 
-print("\n[3/7] Analyzing frames for subtitle style detection...")
-analyze_frames(FRAMES_DIR, ALL_FRAMES_JSON, max_frames=85)
+def transcribe_stage(with_reference: bool, prosody: bool = False):
+    # Both videos go to AssemblyAI together, so the wait is the slower of the two, not the sum.
+    pairs = [(REFERENCE_VIDEO, REF_JSON)] if with_reference else []
+    pairs.append((INPUT_VIDEO, INPUT_JSON))
+    return Stage("transcribe", transcribe_videos, [video for video, _ in pairs],
+                 [output for _, output in pairs] + [INPUT_FEATURES], args=(pairs,), kwargs={"prosody": prosody},
+                 description="Transcribing videos with energy")
 
-print("\n[4/7] Filtering duplicate frames...")
-filter_duplicate_frames(ALL_FRAMES_JSON, FILTERED_FRAMES_JSON)
+def reference_stages(pack_path: str, stream: bool = False):
+    return [
+        *frame_stages(stream),
+        Stage("filter_frames", filter_duplicate_frames, [ALL_FRAMES_JSON], [FILTERED_FRAMES_JSON],
+              args=(ALL_FRAMES_JSON, FILTERED_FRAMES_JSON), description="Filtering duplicate frames"),
+        Stage("styles", extract_styles, [FILTERED_FRAMES_JSON], [TEMPLATES_JSON, STYLE_SEQ_JSON],
+              args=(FILTERED_FRAMES_JSON, TEMPLATES_JSON, STYLE_SEQ_JSON),
+              description="Extracting styles and mapping sequences"),
+        Stage("save_style_pack", save_style_pack, [FILTERED_FRAMES_JSON, TEMPLATES_JSON, STYLE_SEQ_JSON], [pack_path],
+              args=(REFERENCE_VIDEO, FILTERED_FRAMES_JSON, TEMPLATES_JSON, STYLE_SEQ_JSON),
+              description="Storing reference style pack"),
+    ]
 
-print("\n[5/7] Chunking transcription...")
-chunk_transcription(INPUT_JSON, ALL_FRAMES_JSON, CHUNKS_JSON)
+def pack_stages(pack_path: str):
+    return [
+        Stage("load_style_pack", load_style_pack, [pack_path], [FILTERED_FRAMES_JSON, TEMPLATES_JSON, STYLE_SEQ_JSON],
+              args=(pack_path, FILTERED_FRAMES_JSON, TEMPLATES_JSON, STYLE_SEQ_JSON),
+              description="Loading stored reference style pack"),
+    ]
 
-print("\n[6/7] Extracting styles and mapping sequences...")
-extract_styles(FILTERED_FRAMES_JSON, TEMPLATES_JSON, STYLE_SEQ_JSON)
+# The filtered frames keep the largest caption of every run, so they give chunking the
+# same max word count as all_frames.json and are also available when a pack is used.
+# Chunking reads the audio feature index saved next to the transcription.
+def input_stages():
+    return [
+        Stage("chunk", chunk_transcription, [INPUT_JSON, INPUT_FEATURES, FILTERED_FRAMES_JSON, CHUNKING_PROMPT],
+              [CHUNKS_JSON], args=(INPUT_JSON, FILTERED_FRAMES_JSON, CHUNKS_JSON),
+              description="Chunking transcription"),
+        Stage("generate_ass", generate_ass_file, [CHUNKS_JSON, STYLE_SEQ_JSON, TEMPLATES_JSON],
+              [ASS_OUTPUT, LOG_OUTPUT], args=(CHUNKS_JSON, STYLE_SEQ_JSON, TEMPLATES_JSON, ASS_OUTPUT, LOG_OUTPUT),
+              description="Generating final .ASS subtitle file"),
+    ]
 
-print("\n[7/7] Generating final .ASS subtitle file...")
-generate_ass_file(CHUNKS_JSON, STYLE_SEQ_JSON, TEMPLATES_JSON, ASS_OUTPUT, LOG_OUTPUT)
+def build_stages(reanalyze: bool = False, stream: bool = False, prosody: bool = False):
+    store = get_store()
+    reference_hash = hash_file(REFERENCE_VIDEO)
+    pack_path = None if reanalyze else store.find(REFERENCE_VIDEO, reference_hash)
+    if pack_path:
+        return [transcribe_stage(False, prosody)] + pack_stages(pack_path) + input_stages(), True
+    stages = [transcribe_stage(True, prosody)] + reference_stages(store.path_for(reference_hash), stream)
+    return stages + input_stages(), False
 
-print("\n Pipeline complete! Outputs saved in:")
-print(f"  → {REF_JSON}, {INPUT_JSON}")
-print(f"  → Frames: {FRAMES_DIR}/")
-print(f"  → {ALL_FRAMES_JSON}, {FILTERED_FRAMES_JSON}")
-print(f"  → {CHUNKS_JSON}, {TEMPLATES_JSON}, {STYLE_SEQ_JSON}")
-print(f"  → {ASS_OUTPUT}, {LOG_OUTPUT}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transfer caption styling from the reference video to the input video.")
+    parser.add_argument("--force", action="append", default=[], metavar="STAGE",
+                        help="re-run a stage even if its fingerprint is unchanged (repeatable, or 'all')")
+    parser.add_argument("--dry-run", action="store_true", help="list the stages that would execute and exit")
+    parser.add_argument("--reanalyze", action="store_true",
+                        help="analyze the reference video even if a stored style pack matches it")
+    parser.add_argument("--stream", action="store_true",
+                        help="analyze caption events while the reference video is still being decoded")
+    parser.add_argument("--prosody", action="store_true",
+                        help="also extract RMS, spectral flux and pitch (needs librosa) to help place chunk breaks")
+    cli = parser.parse_args()
+
+    stages, from_pack = build_stages(cli.reanalyze, cli.stream, cli.prosody)
+    run_pipeline(stages, max_workers=4, store=FingerprintStore(), force=cli.force, dry_run=cli.dry_run)
+    if cli.dry_run:
+        raise SystemExit(0)
+
+    get_cache().report()
+    get_metrics().report()
+
+    print("\n Pipeline complete! Outputs saved in:")
+    if from_pack:
+        print(f"  → {INPUT_JSON} (reference styles from stored pack)")
+        print(f"  → {FILTERED_FRAMES_JSON}")
+    else:
+        print(f"  → {REF_JSON}, {INPUT_JSON}")
+        print(f"  → Frames: {FRAMES_DIR}/")
+        print(f"  → {ALL_FRAMES_JSON}, {FILTERED_FRAMES_JSON}")
+    print(f"  → {CHUNKS_JSON}, {TEMPLATES_JSON}, {STYLE_SEQ_JSON}")
+    print(f"  → {ASS_OUTPUT}, {LOG_OUTPUT}")
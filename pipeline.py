@@ -0,0 +1,254 @@
+import ast
+import hashlib
+import inspect
+import json
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+FINGERPRINTS_PATH = os.path.join("data", ".stage_fingerprints.json")
+
+def hash_path(path: str) -> str:
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                digest.update(os.path.relpath(full, path).encode("utf-8"))
+                digest.update(hash_path(full).encode("utf-8"))
+    elif os.path.exists(path):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    else:
+        digest.update(b"<missing>")
+    return digest.hexdigest()
+
+def local_imports(source_path: str):
+    """Every repo-local module source_path imports, directly or through other local modules.
+
+    Only modules that sit next to source_path as <name>.py count; the standard library and
+    installed packages are left out.
+    """
+    root = os.path.dirname(os.path.abspath(source_path))
+    found, pending = [], [os.path.abspath(source_path)]
+    while pending:
+        path = pending.pop()
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = os.path.join(root, name.split(".")[0] + ".py")
+                if os.path.exists(candidate) and candidate not in found and candidate != os.path.abspath(source_path):
+                    found.append(candidate)
+                    pending.append(candidate)
+    return sorted(found)
+
+class Stage:
+    def __init__(self, name: str, fn, inputs=(), outputs=(), args=(), kwargs=None, description: str = "", code=()):
+        self.name = name
+        self.fn = fn
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.description = description
+        # Source files whose edits should invalidate this stage: the stage's own module and every
+        # repo-local module it imports are found automatically, `code` only adds files read at runtime.
+        source = inspect.getsourcefile(fn)
+        self.code = [source] + local_imports(source) + list(code)
+
+    def run(self):
+        return self.fn(*self.args, **self.kwargs)
+
+    def fingerprint(self) -> str:
+        digest = hashlib.sha256(self.name.encode("utf-8"))
+        params = json.dumps({"args": self.args, "kwargs": self.kwargs}, sort_keys=True, default=str)
+        digest.update(params.encode("utf-8"))
+        for path in self.inputs + self.code:
+            digest.update(path.encode("utf-8"))
+            digest.update(hash_path(path).encode("utf-8"))
+        return digest.hexdigest()
+
+    def outputs_exist(self) -> bool:
+        return all(os.path.exists(path) for path in self.outputs)
+
+class FingerprintStore:
+    def __init__(self, path: str = FINGERPRINTS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fingerprints = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.fingerprints = json.load(f)
+
+    def is_current(self, stage: Stage, fingerprint: str) -> bool:
+        return self.fingerprints.get(stage.name) == fingerprint and stage.outputs_exist()
+
+    def record(self, stage: Stage, fingerprint: str):
+        with self.lock:
+            self.fingerprints[stage.name] = fingerprint
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.fingerprints, f, indent=2, sort_keys=True)
+
+def resolve_dependencies(stages):
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Stage names must be unique")
+
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(f"'{output}' is produced by both {producers[output]} and {stage.name}")
+            producers[output] = stage.name
+
+    dependencies = {
+        stage.name: sorted({producers[i] for i in stage.inputs if i in producers} - {stage.name})
+        for stage in stages
+    }
+
+    # Kahn's algorithm, only to reject cycles up front.
+    remaining = {name: set(deps) for name, deps in dependencies.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return dependencies
+
+def critical_path(dependencies, timings):
+    finish, previous = {}, {}
+
+    def earliest_finish(name):
+        if name not in finish:
+            best = max(dependencies[name], key=earliest_finish, default=None)
+            previous[name] = best
+            finish[name] = (earliest_finish(best) if best else 0.0) + timings.get(name, 0.0)
+        return finish[name]
+
+    if not dependencies:
+        return [], 0.0
+    end = max(dependencies, key=earliest_finish)
+    path = []
+    while end is not None:
+        path.append(end)
+        end = previous[end]
+    return path[::-1], finish[path[0]]
+
+def check_force(stages, force):
+    force = set(force)
+    unknown = force - {stage.name for stage in stages} - {"all"}
+    if unknown:
+        raise ValueError(f"Unknown stage(s) for --force: {sorted(unknown)}")
+    return force
+
+def plan_pipeline(stages, store: FingerprintStore, force=()):
+    """Stages that would run: changed fingerprint, missing outputs, forced, or downstream of one of those."""
+    dependencies = resolve_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    force = check_force(stages, force)
+    will_run = {}
+
+    def visit(name):
+        if name not in will_run:
+            stage = by_name[name]
+            will_run[name] = (
+                "all" in force or name in force
+                or any(visit(dep) for dep in dependencies[name])
+                or not store.is_current(stage, stage.fingerprint())
+            )
+        return will_run[name]
+
+    return [stage.name for stage in stages if visit(stage.name)]
+
+def run_pipeline(stages, max_workers: int = 4, store: FingerprintStore = None, force=(), dry_run: bool = False):
+    dependencies = resolve_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    force = check_force(stages, force)
+
+    if dry_run:
+        planned = plan_pipeline(stages, store or FingerprintStore(), force)
+        print(" Dry run, stages that would execute:")
+        for name in planned:
+            print(f"  → {name}")
+        if not planned:
+            print("  (none, everything is up to date)")
+        return {}
+
+    timings, failures = {}, {}
+    done = set()
+    running = {}
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def execute(stage):
+        fingerprint = stage.fingerprint() if store is not None else None
+        forced = "all" in force or stage.name in force
+        if store is not None and not forced and store.is_current(stage, fingerprint):
+            return None
+        with lock:
+            print(f"\n▶ {stage.name}: {stage.description or stage.fn.__name__}")
+        t0 = time.perf_counter()
+        stage.run()
+        elapsed = time.perf_counter() - t0
+        if store is not None:
+            store.record(stage, fingerprint)
+        return elapsed
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            blocked = set(failures) | {n for n, deps in dependencies.items() if any(d in failures for d in deps)}
+            for name, deps in dependencies.items():
+                if name in done or name in blocked or name in running.values():
+                    continue
+                if all(d in done for d in deps):
+                    running[pool.submit(execute, by_name[name])] = name
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    elapsed = future.result()
+                    done.add(name)
+                    if elapsed is None:
+                        timings[name] = 0.0
+                        print(f" ⏭ {name} skipped (up to date)")
+                    else:
+                        timings[name] = elapsed
+                        print(f" ✔ {name} finished in {elapsed:.1f}s")
+                except Exception as e:
+                    failures[name] = e
+                    print(f" ✖ {name} failed: {e}")
+
+    total = time.perf_counter() - started
+    report_timings(dependencies, timings, total)
+
+    skipped = [name for name in dependencies if name not in done and name not in failures]
+    if failures:
+        first = next(iter(failures))
+        raise RuntimeError(f"Stage '{first}' failed; skipped dependents: {skipped}") from failures[first]
+    return timings
+
+def report_timings(dependencies, timings, total):
+    completed = {n: [d for d in deps if d in timings] for n, deps in dependencies.items() if n in timings}
+    path, path_time = critical_path(completed, timings)
+    print("\n Stage timings:")
+    for name, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+        marker = "*" if name in path else " "
+        print(f"  {marker} {name:<20} {seconds:7.1f}s")
+    print(f" Critical path: {' → '.join(path)} ({path_time:.1f}s of {total:.1f}s wall clock)")
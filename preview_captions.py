@@ -0,0 +1,94 @@
+import argparse
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from render_captions import ass_filter, parse_ass, run_ffmpeg
+
+def pick_events(events, limit: int = None):
+    if limit and len(events) > limit:
+        picks = np.linspace(0, len(events) - 1, limit).astype(int)
+        return [events[i] for i in picks]
+    return events
+
+def plain_text(fields) -> str:
+    return re.sub(r"\{[^}]*\}", "", fields[-1]).replace(r"\N", " ").strip()
+
+def render_still(video_path: str, ass_path: str, time_s: float, width: int, output_path: str):
+    # -copyts keeps source timestamps so the ass filter draws the event active at time_s.
+    run_ffmpeg([
+        "-ss", f"{time_s:.3f}", "-copyts", "-i", video_path, "-frames:v", "1",
+        "-vf", f"{ass_filter(ass_path)},scale={width}:-2", output_path
+    ])
+
+def render_clip(video_path: str, ass_path: str, start_s: float, duration: float, width: int, output_path: str):
+    run_ffmpeg([
+        "-ss", f"{max(0.0, start_s):.3f}", "-copyts", "-i", video_path, "-t", f"{duration:.3f}", "-an",
+        "-vf", f"{ass_filter(ass_path)},scale={width}:-2,setpts=PTS-STARTPTS",
+        "-c:v", "libx264", "-preset", "ultrafast", "-crf", "32", "-pix_fmt", "yuv420p", output_path
+    ])
+
+def contact_sheet(stills, labels, columns: int = 4):
+    images = [cv2.imread(path) for path in stills]
+    height = max(image.shape[0] for image in images)
+    width = max(image.shape[1] for image in images)
+    cells = []
+    for image, label in zip(images, labels):
+        cell = np.zeros((height + 28, width, 3), dtype=np.uint8)
+        cell[:image.shape[0], :image.shape[1]] = image
+        cv2.putText(cell, label[:60], (6, height + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1, cv2.LINE_AA)
+        cells.append(cell)
+    while len(cells) % columns:
+        cells.append(np.zeros_like(cells[0]))
+    rows = [np.hstack(cells[i:i + columns]) for i in range(0, len(cells), columns)]
+    return np.vstack(rows)
+
+def preview(ass_path: str, video_path: str, output_path: str, mode: str = "sheet", width: int = 480,
+            limit: int = 24, clip_seconds: float = 1.0, columns: int = 4, workers: int = None):
+    _, events = parse_ass(ass_path)
+    events = pick_events(events, limit)
+    if not events:
+        raise ValueError(f"No Dialogue events in {ass_path}")
+    workers = workers or os.cpu_count() or 2
+    midpoints = [(start + end) / 2000.0 for start, end, _ in events]
+
+    with tempfile.TemporaryDirectory(prefix="preview_") as workdir:
+        if mode == "sheet":
+            stills = [os.path.join(workdir, f"still_{n:04d}.jpg") for n in range(len(events))]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(lambda job: render_still(video_path, ass_path, job[0], width, job[1]), zip(midpoints, stills)))
+            labels = [f"{t:.2f}s {plain_text(fields)}" for t, (_, _, fields) in zip(midpoints, events)]
+            cv2.imwrite(output_path, contact_sheet(stills, labels, columns))
+        elif mode == "montage":
+            clips = [os.path.join(workdir, f"clip_{n:04d}.mp4") for n in range(len(events))]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(
+                    lambda job: render_clip(video_path, ass_path, job[0] - clip_seconds / 2, clip_seconds, width, job[1]),
+                    zip(midpoints, clips)
+                ))
+            list_path = os.path.join(workdir, "clips.txt")
+            with open(list_path, "w", encoding="utf-8") as f:
+                f.writelines(f"file '{clip}'\n" for clip in clips)
+            run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path])
+        else:
+            raise ValueError(f"Unknown preview mode: {mode}")
+
+    print(f"🔎 Preview of {len(events)} captions saved to: {output_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a quick caption preview instead of a full burn-in.")
+    parser.add_argument("ass", nargs="?", default=os.path.join("output", "styled_output.ass"))
+    parser.add_argument("video", nargs="?", default="videos/mb_1_plain.mp4")
+    parser.add_argument("--mode", choices=["sheet", "montage"], default="sheet")
+    parser.add_argument("--out", help="output file (default preview.jpg / preview.mp4)")
+    parser.add_argument("--width", type=int, default=480)
+    parser.add_argument("--limit", type=int, default=24, help="maximum number of captions to sample")
+    parser.add_argument("--clip-seconds", type=float, default=1.0)
+    cli = parser.parse_args()
+
+    output = cli.out or ("preview.jpg" if cli.mode == "sheet" else "preview.mp4")
+    preview(cli.ass, cli.video, output, cli.mode, cli.width, cli.limit, cli.clip_seconds)
@@ -0,0 +1,102 @@
+import random
+import re
+import threading
+import time
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_reset_duration(value) -> float:
+    # OpenAI sends resets like "20ms", "1s" or "6m0s"; retry-after is plain seconds.
+    if value is None:
+        return 0.0
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in _DURATION_PART.findall(value))
+
+class TokenBucket:
+    """Requests-per-second limiter that also obeys the server's rate-limit headers.
+
+    An adaptive bucket takes its rate from x-ratelimit-limit-requests (a per-minute
+    limit), so the starting rate is only a seed until the first response arrives.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, adaptive: bool = False):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.adaptive = adaptive
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = max(self.blocked_until - now, (tokens - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers):
+        if headers is None:
+            return
+        retry_after = headers.get("retry-after")
+        if retry_after is not None:
+            self.pause(parse_reset_duration(retry_after))
+
+        if self.adaptive:
+            try:
+                per_minute = float(headers.get("x-ratelimit-limit-requests") or 0)
+            except ValueError:
+                per_minute = 0
+            if per_minute > 0:
+                with self.lock:
+                    self._refill(time.monotonic())
+                    self.rate = per_minute / 60.0
+                    self.capacity = max(1.0, self.rate)
+                    self.tokens = min(self.tokens, self.capacity)
+
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        if remaining is None:
+            return
+        try:
+            remaining = float(remaining)
+        except ValueError:
+            return
+        with self.lock:
+            self.tokens = min(self.tokens, remaining)
+        if remaining <= 0:
+            self.pause(parse_reset_duration(headers.get("x-ratelimit-reset-requests")))
+
+def retry_with_backoff(fn, should_retry, retries: int = 5, base_delay: float = 1.0, max_delay: float = 30.0, limiter: TokenBucket = None):
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= retries or not should_retry(e):
+                raise
+            response = getattr(e, "response", None)
+            headers = getattr(response, "headers", None)
+            delay = min(max_delay, base_delay * (2 ** attempt)) * (0.5 + random.random() / 2)
+            if headers is not None and headers.get("retry-after") is not None:
+                delay = max(delay, parse_reset_duration(headers.get("retry-after")))
+            if limiter is not None:
+                limiter.update_from_headers(headers)
+            attempt += 1
+            time.sleep(delay)
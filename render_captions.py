@@ -0,0 +1,113 @@
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from script7_generate_ass import ms_to_ass_time
+
+def run_ffmpeg(args):
+    result = subprocess.run(["ffmpeg", "-y", "-v", "error"] + args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise Exception(f"FFmpeg error: {result.stderr.decode()}")
+
+def probe(video_path: str, entries: str, *extra) -> str:
+    command = ["ffprobe", "-v", "error", *extra, "-show_entries", entries, "-of", "csv=p=0", video_path]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise Exception(f"FFprobe error: {result.stderr.decode()}")
+    return result.stdout.decode()
+
+def probe_duration(video_path: str) -> float:
+    return float(probe(video_path, "format=duration").strip())
+
+def probe_keyframes(video_path: str):
+    output = probe(video_path, "frame=pts_time", "-select_streams", "v:0", "-skip_frame", "nokey")
+    return sorted(float(line.split(",")[0]) for line in output.splitlines() if line.strip() and line.strip() != "N/A")
+
+def parse_ass_time(value: str) -> int:
+    h, m, s = value.strip().split(":")
+    return int(round((int(h) * 3600 + int(m) * 60 + float(s)) * 1000))
+
+def parse_ass(path: str):
+    """Split an .ass file into its header (through the [Events] Format line) and Dialogue events.
+
+    Events are (start_ms, end_ms, fields) with fields being the Dialogue line split on its first 9 commas.
+    """
+    header, events = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("Dialogue:"):
+                fields = line[len("Dialogue:"):].strip().split(",", 9)
+                events.append((parse_ass_time(fields[1]), parse_ass_time(fields[2]), fields))
+            elif not events:
+                header.append(line)
+    return "".join(header), events
+
+def events_between(events, start_ms: int, end_ms: int):
+    return [event for event in events if event[0] < end_ms and event[1] > start_ms]
+
+def write_ass_slice(header: str, events, start_ms: int, end_ms: int, path: str):
+    # Times are shifted so the slice lines up with a segment whose timestamps start at zero.
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(header.rstrip("\n") + "\n")
+        for event_start, event_end, fields in events:
+            shifted = list(fields)
+            shifted[1] = ms_to_ass_time(max(0, event_start - start_ms))
+            shifted[2] = ms_to_ass_time(min(end_ms, event_end) - start_ms)
+            f.write("Dialogue: " + ",".join(shifted).rstrip("\n") + "\n")
+
+def plan_segments(keyframes, duration: float, target_seconds: float = 20.0):
+    cuts = [0.0]
+    for time_s in keyframes:
+        if time_s - cuts[-1] >= target_seconds and duration - time_s >= target_seconds / 2:
+            cuts.append(time_s)
+    return list(zip(cuts, cuts[1:] + [duration]))
+
+def ass_filter(path: str) -> str:
+    return "ass=" + path.replace("\\", "/").replace(":", "\\:").replace("'", "\\'")
+
+def render_segment(video_path: str, segment_path: str, start_s: float, end_s: float, ass_slice: str,
+                   preset: str = "veryfast", crf: int = 18):
+    # Every segment is re-encoded with the same settings, even ones without captions, so all
+    # pieces share one profile, level, time base and parameter set and concat cleanly.
+    run_ffmpeg([
+        "-ss", f"{start_s:.3f}", "-i", video_path, "-t", f"{end_s - start_s:.3f}", "-map", "0:v:0", "-an",
+        "-vf", ass_filter(ass_slice), "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+        "-pix_fmt", "yuv420p", segment_path
+    ])
+
+def burn_subtitles(video_path: str, ass_path: str, output_path: str, workers: int = None,
+                   segment_seconds: float = 20.0, preset: str = "veryfast", crf: int = 18):
+    """Burn captions in parallel keyframe-aligned segments, then concat them and copy the audio.
+
+    Segments are never stream-copied: mixing copied source packets with x264 output under
+    `-c copy` yields a stream whose SPS/PPS change mid-file.
+    """
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    header, events = parse_ass(ass_path)
+    duration = probe_duration(video_path)
+    segments = plan_segments(probe_keyframes(video_path), duration, segment_seconds)
+
+    with tempfile.TemporaryDirectory(prefix="burn_") as workdir:
+        jobs = []
+        for n, (start_s, end_s) in enumerate(segments):
+            start_ms, end_ms = int(start_s * 1000), int(end_s * 1000)
+            ass_slice = os.path.join(workdir, f"slice_{n:04d}.ass")
+            write_ass_slice(header, events_between(events, start_ms, end_ms), start_ms, end_ms, ass_slice)
+            jobs.append((os.path.join(workdir, f"segment_{n:04d}.mp4"), start_s, end_s, ass_slice))
+
+        print(f"🎬 Rendering {len(jobs)} segments with {workers} workers")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda job: render_segment(video_path, *job, preset=preset, crf=crf), jobs))
+
+        list_path = os.path.join(workdir, "segments.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for segment_path, *_ in jobs:
+                f.write(f"file '{segment_path}'\n")
+
+        run_ffmpeg([
+            "-f", "concat", "-safe", "0", "-i", list_path, "-i", video_path,
+            "-map", "0:v", "-map", "1:a?", "-c", "copy", "-movflags", "+faststart", output_path
+        ])
+
+    print(" Captions applied and saved to:", output_path)
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+CACHE_PATH = os.getenv("CAPLY_CACHE_PATH", "cache/responses.sqlite")
+MAX_BYTES = 512 * 1024 * 1024
+MAX_AGE_DAYS = 30
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            digest.update(data)
+    return digest.hexdigest()
+
+def make_key(kind: str, payload, model: str, prompt: str = "", params: dict = None) -> str:
+    digest = hashlib.sha256()
+    for part in (kind, model, prompt, json.dumps(params or {}, sort_keys=True)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(payload if isinstance(payload, bytes) else str(payload).encode("utf-8"))
+    return digest.hexdigest()
+
+class ResponseCache:
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = MAX_BYTES, max_age_days: float = MAX_AGE_DAYS):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, kind TEXT, value TEXT, size INTEGER, created REAL, accessed REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.conn.commit()
+
+    def get(self, key: str, kind: str = ""):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND created >= ?", (key, now - self.max_age)
+            ).fetchone()
+            if row is None:
+                self.misses[kind] = self.misses.get(kind, 0) + 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+        return json.loads(row[0])
+
+    def put(self, key: str, kind: str, value):
+        text = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, kind, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, text, len(text.encode("utf-8")), now, now)
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now):
+        self.conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def cached(self, kind: str, payload, model: str, prompt: str, params: dict, compute, parse=None):
+        """Return parse(value) for the stored or freshly computed value.
+
+        A fresh value is only stored once parse accepts it, so a malformed reply is asked
+        for again on the next call instead of being replayed; a stored value parse rejects
+        is recomputed.
+        """
+        parse = parse or (lambda value: value)
+        key = make_key(kind, payload, model, prompt, params)
+        value = self.get(key, kind)
+        if value is not None:
+            try:
+                return parse(value)
+            except Exception:
+                pass
+        value = compute()
+        result = parse(value)
+        self.put(key, kind, value)
+        return result
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            kinds = sorted(set(self.hits) | set(self.misses))
+            return {
+                "entries": entries,
+                "bytes": size,
+                "by_kind": {k: {"hits": self.hits.get(k, 0), "misses": self.misses.get(k, 0)} for k in kinds},
+            }
+
+    def report(self):
+        stats = self.stats()
+        print(f" Response cache: {stats['entries']} entries, {stats['bytes'] / 1024:.1f} KiB")
+        for kind, counts in stats["by_kind"].items():
+            print(f"  → {kind}: {counts['hits']} hits, {counts['misses']} misses")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> ResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -1,96 +1,203 @@
 import subprocess
-import requests
-import time
 import json
-import io
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
 import soundfile as sf
 import os
 from typing import Generator, List
-from dotenv import load_dotenv
 
-load_dotenv()
+from audio_features import AudioFeatureIndex, features_path
+from api_clients import get_assemblyai
+from response_cache import get_cache, hash_file, make_key
 
-api_key = os.getenv("ASSEMBLYAI_API_KEY")
+SAMPLE_RATE = 16000
+HOP_SIZE = 160  # 10 ms at 16 kHz
+BLOCK_SIZE = 65536
+TRANSCRIPT_PARAMS = {"auto_chapters": False, "iab_categories": False}
 
-def mp4_to_mp3_bytes(input_path: str) -> bytes:
+def stream_pcm(input_path: str, sample_rate: int = SAMPLE_RATE, block_size: int = BLOCK_SIZE) -> Generator[np.ndarray, None, None]:
     command = [
         'ffmpeg',
+        '-v', 'error',
         '-i', input_path,
-        '-f', 'mp3',
-        '-acodec', 'libmp3lame',
         '-vn',
+        '-ac', '1',
+        '-ar', str(sample_rate),
+        '-f', 'f32le',
         'pipe:1'
     ]
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    if result.returncode != 0:
-        raise Exception(f"FFmpeg error: {result.stderr.decode()}")
-    return result.stdout
-
-def read_in_chunks(data: bytes, chunk_size: int = 5242880) -> Generator[bytes, None, None]:
-    for i in range(0, len(data), chunk_size):
-        yield data[i:i + chunk_size]
-
-def upload_to_assemblyai(audio_bytes: bytes) -> str:
-    headers = {
-        "authorization": api_key,
-        "transfer-encoding": "chunked"
-    }
-    response = requests.post(
-        "https://api.assemblyai.com/v2/upload",
-        headers=headers,
-        data=read_in_chunks(audio_bytes),
-        stream=True
-    )
-    response.raise_for_status()
-    return response.json()['upload_url']
-
-def transcribe_audio_url(audio_url: str) -> List[dict]:
-    headers = {
-        "authorization": api_key,
-        "content-type": "application/json"
-    }
-    response = requests.post(
-        "https://api.assemblyai.com/v2/transcript",
-        headers=headers,
-        json={"audio_url": audio_url, "auto_chapters": False, "iab_categories": False}
-    )
-    transcript_id = response.json()['id']
-
-    while True:
-        polling = requests.get(f"https://api.assemblyai.com/v2/transcript/{transcript_id}", headers=headers)
-        status = polling.json()['status']
-        if status == 'completed':
-            return polling.json()['words']
-        elif status == 'error':
-            raise Exception(f"Transcription failed: {polling.json()['error']}")
-        time.sleep(2)
-
-def energy_data(audio: bytes, transcription: List[dict]) -> List[dict]:
-    audio_data, sample_rate = sf.read(io.BytesIO(audio))
-    if audio_data.ndim > 1:
-        audio_data = np.mean(audio_data, axis=1)
-
-    for word in transcription:
-        start_sec = word["start"] / 1000.0
-        end_sec = word["end"] / 1000.0
-        start_sample = int(start_sec * sample_rate)
-        end_sample = int(end_sec * sample_rate)
-        word_audio = audio_data[start_sample:end_sample]
-        energy = float(np.sqrt(np.mean(word_audio**2))) if len(word_audio) > 0 else 0.0
-        word["energy"] = energy
-
-    return transcription
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            buffer = process.stdout.read(block_size * 4)
+            if not buffer:
+                break
+            yield np.frombuffer(buffer, dtype=np.float32)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise Exception(f"FFmpeg error: {stderr.decode()}")
+
+def decode_audio(input_path: str, upload_path: str, index: AudioFeatureIndex) -> AudioFeatureIndex:
+    """Decode once: write a FLAC copy for upload and feed every block into the feature index."""
+    with sf.SoundFile(upload_path, 'w', samplerate=index.sample_rate, channels=1, format='FLAC', subtype='PCM_16') as out:
+        for block in stream_pcm(input_path, index.sample_rate):
+            out.write(block)
+            index.update(block)
+    return index.finalize()
+
+def read_in_chunks(path: str, chunk_size: int = 5242880) -> Generator[bytes, None, None]:
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            yield data
+
+def upload_to_assemblyai(audio_path: str) -> str:
+    return get_assemblyai().upload(read_in_chunks(audio_path))
+
+def energy_data(index: AudioFeatureIndex, transcription: List[dict]) -> List[dict]:
+    return index.score_words(transcription)
 
 def save_to_json(data: List[dict], output_path: str):
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     with open(output_path, 'w', encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
 
-def process_video(video_path: str, output_path: str):
-    audio_bytes = mp4_to_mp3_bytes(video_path)
-    audio_url = upload_to_assemblyai(audio_bytes)
-    words = transcribe_audio_url(audio_url)
-    enhanced = energy_data(audio_bytes, words)
+def finish_transcription(index: AudioFeatureIndex, words: List[dict], output_path: str) -> List[dict]:
+    enhanced = energy_data(index, words)
     save_to_json(enhanced, output_path)
+    index.save(features_path(output_path))
     print(f" Saved transcription with energy to {output_path}")
+    return enhanced
+
+class TranscriptionJobs:
+    """Transcribe many files at once.
+
+    Each submitted file is decoded and uploaded on a worker thread, so one file's upload
+    overlaps the next one's decode. Submitted transcripts are then polled together by a
+    single background loop that backs off while nothing changes. submit() returns a
+    Future for the energy-scored words.
+    """
+
+    def __init__(self, workers: int = 4, timeout: float = 1800.0, initial_interval: float = 1.0,
+                 max_interval: float = 15.0):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcribe")
+        self.timeout = timeout
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.poller = None
+
+    def submit(self, video_path: str, output_path: str, prosody: bool = False) -> Future:
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self.pool.submit(self._prepare, future, video_path, output_path, prosody)
+        return future
+
+    def _prepare(self, future: Future, video_path: str, output_path: str, prosody: bool):
+        try:
+            index = AudioFeatureIndex(SAMPLE_RATE, HOP_SIZE, prosody=prosody)
+            fd, upload_path = tempfile.mkstemp(suffix=".flac")
+            os.close(fd)
+            try:
+                decode_audio(video_path, upload_path, index)
+                key = make_key("assemblyai", hash_file(upload_path), "assemblyai-v2", "", TRANSCRIPT_PARAMS)
+                words = get_cache().get(key, "assemblyai")
+                if words is None:
+                    client = get_assemblyai()
+                    transcript_id = client.submit(upload_to_assemblyai(upload_path), TRANSCRIPT_PARAMS)
+            finally:
+                os.remove(upload_path)
+        except Exception as e:
+            future.set_exception(e)
+            return
+
+        if words is not None:
+            self._complete(future, index, words, output_path)
+            return
+        with self.lock:
+            self.pending[transcript_id] = (future, index, output_path, key, time.monotonic() + self.timeout)
+            if self.poller is None:
+                self.poller = threading.Thread(target=self._poll_loop, name="transcript-poller", daemon=True)
+                self.poller.start()
+        self.wakeup.set()
+
+    def _complete(self, future: Future, index: AudioFeatureIndex, words: List[dict], output_path: str):
+        try:
+            future.set_result(finish_transcription(index, words, output_path))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _poll_loop(self):
+        client = get_assemblyai()
+        interval = self.initial_interval
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.poller = None
+                    return
+                jobs = dict(self.pending)
+
+            for transcript_id, (future, index, output_path, key, deadline) in jobs.items():
+                try:
+                    transcript = client.get_transcript(transcript_id)
+                    if transcript["status"] == "completed":
+                        get_cache().put(key, "assemblyai", transcript["words"])
+                        done = transcript["words"]
+                    elif transcript["status"] == "error":
+                        raise Exception(f"Transcription failed: {transcript['error']}")
+                    elif time.monotonic() > deadline:
+                        raise TimeoutError(f"Transcript {transcript_id} did not finish within {self.timeout:g}s")
+                    else:
+                        continue
+                except Exception as e:
+                    with self.lock:
+                        del self.pending[transcript_id]
+                    future.set_exception(e)
+                    continue
+                with self.lock:
+                    del self.pending[transcript_id]
+                self.pool.submit(self._complete, future, index, done, output_path)
+
+            # New submissions restart the short interval; otherwise back off while we wait.
+            if self.wakeup.wait(interval):
+                self.wakeup.clear()
+                interval = self.initial_interval
+            else:
+                interval = min(self.max_interval, interval * 1.5)
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+def get_transcription_jobs() -> TranscriptionJobs:
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = TranscriptionJobs()
+        return _jobs
+
+def transcribe_videos(pairs, prosody: bool = False, return_exceptions: bool = False):
+    """Transcribe (video_path, output_path) pairs together; takes about as long as the slowest one.
+
+    With return_exceptions a failed file gives its exception in place of the words
+    instead of raising, so the other files' results are not lost.
+    """
+    futures = [get_transcription_jobs().submit(video_path, output_path, prosody) for video_path, output_path in pairs]
+    if return_exceptions:
+        return [future.exception() or future.result() for future in futures]
+    return [future.result() for future in futures]
+
+def process_video(video_path: str, output_path: str, prosody: bool = False):
+    # Goes through the shared job manager so concurrent callers (pipeline stages,
+    # batch clips) share one upload pool and one polling loop.
+    return get_transcription_jobs().submit(video_path, output_path, prosody).result()
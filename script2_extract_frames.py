@@ -1,31 +1,228 @@
 import cv2
 import os
+import json
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
 
-def extract_frames(video_path: str, output_folder: str, target_fps: int = 2):
+from caption_roi import detect_caption_roi_in_video
+from frame_hash import crop_roi
+
+FRAME_TIMES_FILE = "frame_times.json"
+
+def frame_name(index: int) -> str:
+    return f'frame_{index:05d}.jpg'
+
+def reset_output(output_folder: str):
     os.makedirs(output_folder, exist_ok=True)
+    for name in os.listdir(output_folder):
+        if name.startswith("frame_") and name.endswith(".jpg") or name == FRAME_TIMES_FILE:
+            os.remove(os.path.join(output_folder, name))
+
+def save_frame_times(output_folder: str, frame_times: dict):
+    with open(os.path.join(output_folder, FRAME_TIMES_FILE), "w", encoding="utf-8") as f:
+        json.dump(frame_times, f, indent=2)
+
+def load_frame_times(folder: str) -> dict:
+    path = os.path.join(folder, FRAME_TIMES_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def frame_step(fps: float, target_fps: float) -> float:
+    # Exact source-frames-per-sample; rounding each sample position avoids the drift
+    # an integer interval accumulates at ratios like 29.97 / 2.
+    return max(1.0, fps / target_fps)
+
+def _iter_range(cap, step: float, start_k: int = 0, end_k: int = None):
+    samples = count(start_k) if end_k is None else range(start_k, end_k)
+    position = 0
+
+    first_target = int(round(start_k * step))
+    if first_target > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first_target)
+        position = first_target
+
+    for k in samples:
+        target = int(round(k * step))
+        while position < target:
+            if not cap.grab():
+                return
+            position += 1
+
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position += 1
+        yield k, target, frame
+
+def _extract_range(video_path: str, output_folder: str, step: float, fps: float, start_k: int,
+                   end_k: int = None) -> dict:
+    """Save the samples start_k..end_k and return their {frame_name: {"time_ms": ...}} entries."""
+    cap = cv2.VideoCapture(video_path)
+    frame_times = {}
+    for k, target, frame in _iter_range(cap, step, start_k, end_k):
+        name = frame_name(k)
+        cv2.imwrite(os.path.join(output_folder, name), frame)
+        frame_times[name] = {"time_ms": int(round(target / fps * 1000))}
+    cap.release()
+    return frame_times
+
+def extract_frames(video_path: str, output_folder: str, target_fps: int = 2, workers: int = 1, segment_seconds: float = 60.0):
+    reset_output(output_folder)
 
     cap = cv2.VideoCapture(video_path)
     fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
     if fps == 0:
         raise ValueError("Unable to determine video FPS.")
 
-    frame_interval = int(fps / target_fps)
-    frame_num = 0
-    saved_count = 0
-
+    step = frame_step(fps, target_fps)
     print(f"📸 Extracting frames from: {video_path}")
 
-    while cap.isOpened():
-        ret, frame = cap.read()
+    samples_per_segment = max(1, int(segment_seconds * target_fps))
+    total_samples = int((frame_count - 1) // step) + 1 if frame_count > 0 else 0
+
+    if workers <= 1 or total_samples <= samples_per_segment:
+        frame_times = _extract_range(video_path, output_folder, step, fps, 0)
+    else:
+        # The last range runs to EOF because CAP_PROP_FRAME_COUNT is only an estimate.
+        starts = list(range(0, total_samples, samples_per_segment))
+        ends = starts[1:] + [None]
+        frame_times = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for times in pool.map(
+                _extract_range,
+                [video_path] * len(starts), [output_folder] * len(starts), [step] * len(starts), [fps] * len(starts),
+                starts, ends
+            ):
+                frame_times.update(times)
+
+    save_frame_times(output_folder, frame_times)
+    saved_count = len(frame_times)
+
+    print(f" Saved {saved_count} frames to: {output_folder}")
+    return saved_count
+
+class _FrameReader:
+    def __init__(self, video_path: str, roi=None, width: int = 64):
+        self.cap = cv2.VideoCapture(video_path)
+        self.roi = roi
+        self.width = width
+        self.position = 0
+
+    def read(self, index: int):
+        # Sequential reads grab forward; anything else seeks.
+        if index < self.position or index - self.position > 50:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            self.position = index
+        while self.position < index:
+            if not self.cap.grab():
+                return None
+            self.position += 1
+        ret, frame = self.cap.read()
         if not ret:
-            break
+            return None
+        self.position += 1
+        return frame
 
-        if frame_num % frame_interval == 0:
-            frame_path = os.path.join(output_folder, f'frame_{saved_count:05d}.jpg')
-            cv2.imwrite(frame_path, frame)
-            saved_count += 1
+    def signature(self, frame):
+        region = cv2.cvtColor(crop_roi(frame, self.roi), cv2.COLOR_BGR2GRAY)
+        height = max(1, int(region.shape[0] * self.width / region.shape[1]))
+        return cv2.resize(region, (self.width, height), interpolation=cv2.INTER_AREA).astype(np.float32)
 
-        frame_num += 1
+    def release(self):
+        self.cap.release()
 
+def _changed(a, b, threshold):
+    return float(np.mean(np.abs(a - b))) > threshold
+
+def _find_transitions(reader, lo, lo_sig, hi, hi_sig, threshold):
+    """Frame indices in (lo, hi] where the caption changes, found by bisection."""
+    transitions = []
+    # Several captions can pass between two samples, so keep splitting the
+    # interval until the frame after each found transition matches hi.
+    while _changed(lo_sig, hi_sig, threshold):
+        left, right = lo, hi
+        while right - left > 1:
+            mid = (left + right) // 2
+            mid_frame = reader.read(mid)
+            if mid_frame is None:
+                break
+            if _changed(reader.signature(mid_frame), lo_sig, threshold):
+                right = mid
+            else:
+                left = mid
+        transitions.append(right)
+        right_frame = reader.read(right) if right != hi else None
+        if right_frame is None:
+            break
+        lo, lo_sig = right, reader.signature(right_frame)
+    return transitions
+
+def iter_caption_events(video_path: str, coarse_fps: float = 2, roi=None, threshold: float = 8.0):
+    """Yield (frame_name, frame, times) for each caption event as soon as the next one begins.
+
+    Sampling is coarse and each caption change is bisected to the exact frame; the yielded
+    frame is the middle of its event. roi must already be resolved (a box or None).
+    """
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
     cap.release()
-    print(f" Saved {saved_count} frames to: {output_folder}")
\ No newline at end of file
+    if fps == 0:
+        raise ValueError("Unable to determine video FPS.")
+
+    reader = _FrameReader(video_path, roi)
+    step = frame_step(fps, coarse_fps)
+    n, start, previous = 0, 0, None
+
+    def event(start, end):
+        representative = (start + end - 1) // 2
+        frame = reader.read(representative)
+        if frame is None:
+            return None
+        return frame_name(n), frame, {
+            "time_ms": int(round(representative / fps * 1000)),
+            "start_ms": int(round(start / fps * 1000)),
+            "end_ms": int(round(end / fps * 1000)),
+        }
+
+    try:
+        for k in count():
+            index = int(round(k * step))
+            frame = reader.read(index)
+            if frame is None:
+                break
+            signature = reader.signature(frame)
+            if previous is not None:
+                for transition in _find_transitions(reader, *previous, index, signature, threshold):
+                    found = event(start, transition)
+                    if found:
+                        yield found
+                    n, start = n + 1, transition
+            previous = (index, signature)
+        if previous is None:
+            raise ValueError("No frames could be decoded.")
+        found = event(start, previous[0] + max(1, int(round(step))))
+        if found:
+            yield found
+    finally:
+        reader.release()
+
+def extract_caption_events(video_path: str, output_folder: str, coarse_fps: float = 2, roi="auto", threshold: float = 8.0):
+    """Sample coarsely, bisect each caption change to the exact frame, save one frame per caption event."""
+    reset_output(output_folder)
+    if roi == "auto":
+        roi = detect_caption_roi_in_video(video_path)
+    print(f"📸 Sampling caption events from: {video_path} (region {roi})")
+
+    frame_times = {}
+    for name, frame, times in iter_caption_events(video_path, coarse_fps, roi, threshold):
+        cv2.imwrite(os.path.join(output_folder, name), frame)
+        frame_times[name] = times
+
+    save_frame_times(output_folder, frame_times)
+    print(f" Saved {len(frame_times)} caption events to: {output_folder}")
+    return frame_times
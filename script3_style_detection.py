@@ -1,19 +1,41 @@
 import os
 import base64
+import hashlib
 import json
+import threading
 from pathlib import Path
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+import cv2
 from tqdm import tqdm
-from dotenv import load_dotenv
-import openai
 
-load_dotenv()
-API_KEY = os.getenv("OPENAI_API_KEY")
-client = openai.Client(api_key=API_KEY)
+from api_clients import chat_completion
+from rate_limiter import TokenBucket
+from response_cache import get_cache
+from frame_journal import FrameJournal, frame_digest, journal_path
+from frame_hash import CaptionGrouper, caption_hash, dhash_file, group_by_caption, dedup_report
+from caption_roi import detect_caption_roi, detect_caption_roi_in_video, crop_and_encode
+from script2_extract_frames import iter_caption_events, load_frame_times, reset_output, save_frame_times
 
-def image_to_base64(path):
-    with open(path, "rb") as f:
-        return base64.b64encode(f.read()).decode("utf-8")
+STYLE_MODEL = "gpt-4o"
+SYSTEM_PROMPT = "You are a subtitle caption visual style extractor."
+STYLE_PARAMS = {"temperature": 0.2, "max_tokens": 1000}
+# Only the starting rate: the limiter follows the account's x-ratelimit-* headers after that.
+DEFAULT_REQUESTS_PER_MINUTE = 500
+BATCH_PROMPT = (
+    "\n\nYou are given {count} separate frames, each preceded by a 'Frame <id>' label. "
+    "Analyze every frame independently and return JSON in this exact format: "
+    '{{"frames": {{"<id>": {{"words": [ ...word objects as above... ]}}}}}} '
+    "with exactly one entry per frame id."
+)
+
+def frame_payload(path, roi=None, max_width=768):
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError(f"Unable to read image: {path}")
+    jpeg, scale = crop_and_encode(image, roi, max_width)
+    return base64.b64encode(jpeg).decode("utf-8"), scale
 
 def extract_frame_number(filename):
     match = re.search(r"(\d+)", filename)
@@ -29,11 +51,12 @@ def hex_to_ass_color(hex_color):
     r, g, b = hex_color[0:2], hex_color[2:4], hex_color[4:6]
     return f"&H{b}{g}{r}".upper()
 
-def normalize_word(word_obj):
+def normalize_word(word_obj, scale=1.0):
+    # scale is crop pixels per source pixel; font sizes are reported back in source pixels.
     return {
         "text": word_obj.get("text", ""),
         "fontname": word_obj.get("font", "Poppins"),
-        "fontsize": int(word_obj.get("font_size", 48)),
+        "fontsize": int(round(float(word_obj.get("font_size", 48 * scale)) / scale)),
         "primary_colour": hex_to_ass_color(word_obj.get("color", "#FFFFFF")),
         "bold": -1 if str(word_obj.get("bold", False)).lower() in ["true", "-1", "1"] else 0,
         "italic": -1 if str(word_obj.get("italic", False)).lower() in ["true", "-1", "1"] else 0,
@@ -45,47 +68,261 @@ def normalize_word(word_obj):
 def generate_prompt():
     return Path("prompts/frame_style_prompt.txt").read_text(encoding="utf-8")
 
-def analyze_frames(folder: str, output_path: str, max_frames: int = 85):
+def request_completion(content, params, limiter=None):
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": content}
+    ]
+    return chat_completion(STYLE_MODEL, messages, params, limiter, endpoint="openai.frame_style")
+
+def image_part(image_b64):
+    return {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"}}
+
+def request_frame_style(image_b64, prompt, limiter=None, scale=1.0):
+    content = [{"type": "text", "text": prompt}, image_part(image_b64)]
+    words = get_cache().cached(
+        "frame_style", image_b64, STYLE_MODEL, SYSTEM_PROMPT + prompt, STYLE_PARAMS,
+        lambda: request_completion(content, STYLE_PARAMS, limiter),
+        parse=lambda raw: json.loads(clean_json_text(raw)).get("words", [])
+    )
+    return [normalize_word(word, scale) for word in words]
+
+def request_batch_styles(batch, prompt, limiter=None):
+    """Analyze several frames in one message. batch is a list of (frame_id, image_b64, scale)."""
+    batch_prompt = prompt + BATCH_PROMPT.format(count=len(batch))
+    content = [{"type": "text", "text": batch_prompt}]
+    for frame_id, image_b64, _ in batch:
+        content.append({"type": "text", "text": f"Frame {frame_id}"})
+        content.append(image_part(image_b64))
+
+    params = dict(STYLE_PARAMS, max_tokens=min(16000, STYLE_PARAMS["max_tokens"] * len(batch)))
+    payload = "\0".join(f"{frame_id}:{image_b64}" for frame_id, image_b64, _ in batch)
+
+    def parse(raw):
+        # A reply missing any frame is rejected here, so it is never cached.
+        frames = json.loads(clean_json_text(raw))["frames"]
+        return {frame_id: frames[str(frame_id)]["words"] for frame_id, _, _ in batch}
+
+    frames = get_cache().cached(
+        "frame_style_batch", payload, STYLE_MODEL, SYSTEM_PROMPT + batch_prompt, params,
+        lambda: request_completion(content, params, limiter), parse=parse
+    )
+    return {
+        frame_id: [normalize_word(word, scale) for word in frames[frame_id]]
+        for frame_id, _, scale in batch
+    }
+
+def make_limiter(requests_per_minute: float = None) -> TokenBucket:
+    # An explicit requests_per_minute pins the rate; otherwise the headers drive it.
+    if requests_per_minute:
+        return TokenBucket(requests_per_minute / 60.0)
+    return TokenBucket(DEFAULT_REQUESTS_PER_MINUTE / 60.0, adaptive=True)
+
+class FrameAnalyzer:
+    """Journal, batching and retries shared by the folder and streaming analyzers.
+
+    Frames are (index, name, digest, load) tuples; load() returns (image_b64, scale) and
+    may raise for an unreadable frame, which is then journaled like a failed request.
+    """
+
+    def __init__(self, output_path: str, requests_per_minute: float = None):
+        self.journal = FrameJournal(journal_path(output_path))
+        self.prompt = generate_prompt()
+        self.limiter = make_limiter(requests_per_minute)
+        self.words = {}
+
+    def completed(self, name: str, digest: str) -> bool:
+        words = self.journal.completed(name, digest)
+        if words is not None:
+            self.words[name] = words
+        return words is not None
+
+    def _finish(self, frame, words):
+        _, name, digest, _ = frame
+        self.words[name] = words
+        self.journal.record(name, digest, words)
+
+    def analyze_batch(self, frames):
+        # An unreadable frame is journaled like a failed request instead of sinking its whole batch.
+        payloads, failed = {}, []
+        for frame in frames:
+            try:
+                payloads[frame[0]] = (frame, *frame[3]())
+            except Exception as e:
+                self.journal.record_error(frame[1], frame[2], e)
+                failed.append(frame)
+        if len(payloads) > 1:
+            try:
+                batch = [(i, image_b64, scale) for i, (_, image_b64, scale) in payloads.items()]
+                for i, words in request_batch_styles(batch, self.prompt, self.limiter).items():
+                    self._finish(payloads[i][0], words)
+                return failed
+            except Exception as e:
+                print(f" Batch of {len(payloads)} failed ({e}), falling back to single frames")
+        for frame, image_b64, scale in payloads.values():
+            try:
+                self._finish(frame, request_frame_style(image_b64, self.prompt, self.limiter, scale))
+            except Exception as e:
+                self.journal.record_error(frame[1], frame[2], e)
+                failed.append(frame)
+        return failed
+
+    def run_batches(self, batches, concurrency: int, desc: str, max_pending: int = None):
+        """Analyze batches on a thread pool and return the frames that failed.
+
+        batches may be a generator that is still decoding; with max_pending set, it is only
+        advanced while fewer than max_pending batches are queued or running.
+        """
+        slots = threading.BoundedSemaphore(max_pending) if max_pending else None
+        failed, futures = [], []
+        progress = tqdm(total=len(batches) if hasattr(batches, "__len__") else None, desc=desc)
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for batch in batches:
+                if slots:
+                    slots.acquire()
+                future = pool.submit(self.analyze_batch, batch)
+                future.add_done_callback(lambda _: progress.update(1))
+                if slots:
+                    future.add_done_callback(lambda _: slots.release())
+                futures.append(future)
+            for future in as_completed(futures):
+                failed.extend(future.result())
+        progress.close()
+        return sorted(failed, key=lambda frame: frame[0])
+
+    def run(self, batches, concurrency: int, max_pending: int = None):
+        try:
+            failed = self.run_batches(batches, concurrency, "Analyzing Frames", max_pending)
+            if failed:
+                print(f" Retrying {len(failed)} failed frames one at a time")
+                failed = self.run_batches([[frame] for frame in failed], concurrency, "Retrying Frames")
+        finally:
+            self.journal.compact()
+            self.journal.close()
+
+        for _, name, _, _ in failed:
+            print(f" Error on {name}: {self.journal.entries[name]['error']}")
+        if failed:
+            print(f"⚠️ {len(failed)} frames still failed; rerun to retry them, "
+                  f"finished frames are kept in {self.journal.path}")
+
+    def results(self, names):
+        return [{"frame": name, "words": self.words[name]} if name in self.words else None for name in names]
+
+def analyze_frames(folder: str, output_path: str, max_frames: int = 85, concurrency: int = 1,
+                   requests_per_minute: float = None, dedup: bool = True, hash_threshold: int = 3,
+                   roi="auto", max_width: int = 768, batch_size: int = 1):
     files = sorted([
         f for f in os.listdir(folder) if f.lower().endswith((".jpg", ".png"))
     ], key=extract_frame_number)[:max_frames]
 
-    print(f"🎨 Processing {len(files)} frames in '{folder}'")
-    all_data = []
-
-    for filename in tqdm(files, desc="Analyzing Frames"):
-        image_path = os.path.join(folder, filename)
-        image_b64 = image_to_base64(image_path)
+    if roi == "auto":
+        roi = detect_caption_roi([os.path.join(folder, f) for f in files])
+        print(f" Caption region: {roi if roi else 'not found, sending full frames'}")
 
+    def caption_dhash(name):
+        # An unreadable frame is left unhashed; analyze_batch then journals it as an error.
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a subtitle caption visual style extractor."},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": generate_prompt()},
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"}}
-                        ]
-                    }
-                ],
-                temperature=0.2,
-                max_tokens=1000
-            )
-
-            raw = response.choices[0].message.content
-            cleaned = clean_json_text(raw)
-            words = json.loads(cleaned).get("words", [])
-            normalized = [normalize_word(word) for word in words]
-
-            all_data.append({"frame": filename, "words": normalized})
-
-        except Exception as e:
-            print(f" Error on {filename}: {e}")
+            return dhash_file(os.path.join(folder, name), roi)
+        except ValueError:
+            return None
+
+    if dedup:
+        hashes = [caption_dhash(f) for f in files]
+        representatives = group_by_caption(hashes, hash_threshold)
+    else:
+        representatives = list(range(len(files)))
+    to_send = sorted(set(representatives))
+
+    analyzer = FrameAnalyzer(output_path, requests_per_minute)
+    pending = []
+    for i in to_send:
+        path = os.path.join(folder, files[i])
+        frame = (i, files[i], frame_digest(path), partial(frame_payload, path, roi, max_width))
+        if not analyzer.completed(frame[1], frame[2]):
+            pending.append(frame)
+
+    print(f"🎨 Processing {len(files)} frames in '{folder}' ({len(to_send)} unique captions, "
+          f"{len(to_send) - len(pending)} already journaled, {concurrency} concurrent)")
+    batch_size = max(1, batch_size)
+    analyzer.run([pending[k:k + batch_size] for k in range(0, len(pending), batch_size)], concurrency)
+
+    save_frame_results(files, analyzer.results(files), representatives, load_frame_times(folder), output_path)
+    print(dedup_report(len(files), len(to_send)))
+    print(f" Frame style data saved to: {output_path}")
+
+def analyze_video(video_path: str, output_path: str, frames_dir: str = None, coarse_fps: float = 2,
+                  max_frames: int = 85, concurrency: int = 1, requests_per_minute: float = None, dedup: bool = True,
+                  hash_threshold: int = 3, roi="auto", max_width: int = 768, batch_size: int = 1, max_pending: int = 4):
+    """Sample caption events and analyze them while the video is still being decoded.
+
+    Each event frame is cropped and JPEG-encoded once in memory and handed to the workers in
+    batches, with at most max_pending batches waiting, so decoding overlaps the vision calls.
+    Journal, dedup and retries are the same as analyze_frames. Pass frames_dir to also keep
+    the full frames and frame_times.json on disk.
+    """
+    if roi == "auto":
+        roi = detect_caption_roi_in_video(video_path)
+        print(f" Caption region: {roi if roi else 'not found, sending full frames'}")
+    if frames_dir:
+        reset_output(frames_dir)
+
+    analyzer = FrameAnalyzer(output_path, requests_per_minute)
+    grouper = CaptionGrouper(hash_threshold)
+    names, representatives, frame_times = [], [], {}
+    journaled = 0
+
+    def batches():
+        nonlocal journaled
+        pending = []
+        for name, image, times in iter_caption_events(video_path, coarse_fps, roi):
+            if len(names) >= max_frames:
+                break
+            i = len(names)
+            names.append(name)
+            frame_times[name] = times
+            if frames_dir:
+                cv2.imwrite(os.path.join(frames_dir, name), image)
+            representatives.append(grouper.add(caption_hash(image, roi)) if dedup else i)
+            if representatives[i] != i:
+                continue
+            jpeg, scale = crop_and_encode(image, roi, max_width)
+            payload = (base64.b64encode(jpeg).decode("utf-8"), scale)
+            frame = (i, name, hashlib.sha256(jpeg).hexdigest(), lambda payload=payload: payload)
+            if analyzer.completed(name, frame[2]):
+                journaled += 1
+                continue
+            pending.append(frame)
+            if len(pending) >= max(1, batch_size):
+                yield pending
+                pending = []
+        if pending:
+            yield pending
+
+    print(f"🎨 Streaming caption events from '{video_path}' ({concurrency} concurrent)")
+    analyzer.run(batches(), concurrency, max_pending)
+    if frames_dir:
+        save_frame_times(frames_dir, frame_times)
+
+    sent = len(set(representatives))
+    print(f" {journaled} of {sent} unique captions were already journaled")
+    save_frame_results(names, analyzer.results(names), representatives, frame_times, output_path)
+    print(dedup_report(len(names), sent))
+    print(f" Frame style data saved to: {output_path}")
+
+def save_frame_results(names, results, representatives, frame_times, output_path):
+    for i, rep in enumerate(representatives):
+        if rep != i and results[rep] is not None:
+            words = [dict(word) for word in results[rep]["words"]]
+            results[i] = {"frame": names[i], "words": words, "duplicate_of": names[rep]}
+
+    for result in results:
+        if result is not None and result["frame"] in frame_times:
+            result.update(frame_times[result["frame"]])
+
+    all_data = [result for result in results if result is not None]
 
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(all_data, f, indent=2)
-
-    print(f" Frame style data saved to: {output_path}")
\ No newline at end of file
+    return all_data
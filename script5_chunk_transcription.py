@@ -1,28 +1,197 @@
-from langchain_openai import ChatOpenAI
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import bisect
 import json
 import re
 
+from alignment import attach_timestamps
+from api_clients import chat_completion
+from audio_features import load_features
+from response_cache import get_cache
+from local_chunker import build_chunks, chunk_boundaries, chunk_locally
+
+CHUNK_MODEL = "gpt-4o"
+CHUNK_TEMPERATURE = 0.3
+WINDOW_WORDS = 150
+OVERLAP_WORDS = 20
+
 def clean_output(raw: str) -> str:
     return re.sub(r"^```(?:json|ass)?|```$", "", raw.strip(), flags=re.MULTILINE).strip()
 
-def chunk_transcription(transcription_path: str, all_frames_path: str, output_path: str):
-    transcription = json.load(open(transcription_path, encoding="utf-8"))
-    all_frames = json.load(open(all_frames_path, encoding="utf-8"))
-    prompt_static = Path("prompts/chunking_prompt.txt").read_text(encoding="utf-8")
+def parse_chunks(raw: str):
+    chunks = json.loads(clean_output(raw))
+    if not isinstance(chunks, list) or not all(isinstance(c, dict) and "words" in c for c in chunks):
+        raise ValueError("Chunking reply is not a list of chunks with words")
+    return chunks
 
-    max_words = max(len(f.get("words", [])) for f in all_frames)
+def invoke_llm(chunk_prompt: str):
+    """Chunks for chunk_prompt; only replies that parse as chunks are cached."""
+    params = {"temperature": CHUNK_TEMPERATURE}
+
+    def invoke():
+        messages = [{"role": "user", "content": chunk_prompt}]
+        return chat_completion(CHUNK_MODEL, messages, params, endpoint="openai.chunking")
+
+    return get_cache().cached("chunking", chunk_prompt, CHUNK_MODEL, "", params, invoke, parse=parse_chunks)
+
+def compact_words(words) -> str:
+    columns = {
+        "text": [w["text"] for w in words],
+        "start": [w["start"] for w in words],
+        "end": [w["end"] for w in words],
+        "energy": [round(w.get("energy", 0.0), 3) for w in words],
+    }
+    return json.dumps(columns, separators=(",", ":"), ensure_ascii=False)
+
+def split_windows(words, window_words: int = WINDOW_WORDS, overlap_words: int = OVERLAP_WORDS):
+    """Split at the longest pause in the last quarter of each window.
+
+    Returns (start, end, core_start, core_end) word ranges; the cores partition the
+    transcript and each window adds up to overlap_words of context on both sides.
+    """
+    windows = []
+    pos, n = 0, len(words)
+    while pos < n:
+        cut = pos + window_words
+        if cut >= n:
+            cut = n
+        else:
+            lo = pos + max(1, (window_words * 3) // 4)
+            cut = max(range(lo, cut + 1), key=lambda i: words[i]["start"] - words[i - 1]["end"])
+        windows.append((max(0, pos - overlap_words), min(n, cut + overlap_words), pos, cut))
+        pos = cut
+    return windows
+
+def stitch_windows(words, windows, window_chunks, max_words: int = 5):
+    """Merge per-window chunks so every transcript word lands in exactly one chunk.
+
+    Chunks are taken in order by the window whose core holds their first word (or an
+    earlier one). A chunk overlapping words already covered is trimmed to the words after
+    them, and any words no window covered are chunked locally.
+    """
+    starts = [w["start"] for w in words]
+    ends = [w["end"] for w in words]
+
+    def word_index(times, ms):
+        i = bisect.bisect_left(times, ms)
+        if i == len(times) or (i > 0 and ms - times[i - 1] < times[i] - ms):
+            i -= 1
+        return max(0, i)
+
+    def trimmed(chunk, lo, hi):
+        texts = [w["text"].strip() for w in words[lo:hi + 1]]
+        return dict(chunk, chunk_text=" ".join(texts), words=texts,
+                    start_time=words[lo]["start"], end_time=words[hi]["end"])
+
+    stitched = []
+    last_end = -1
+
+    def fill(lo, hi):
+        if hi > lo:
+            stitched.extend(chunk_locally(words[lo:hi], max_words))
+
+    for (_, _, _, core_end), chunks in zip(windows, window_chunks):
+        for chunk in sorted(chunks, key=lambda c: c["start_time"]):
+            first = word_index(starts, chunk["start_time"])
+            last = max(first, word_index(ends, chunk["end_time"]))
+            if first >= core_end or last <= last_end:
+                continue
+            if first <= last_end:
+                chunk = trimmed(chunk, last_end + 1, last)
+            else:
+                fill(last_end + 1, first)
+            stitched.append(chunk)
+            last_end = last
+    fill(last_end + 1, len(words))
+    return stitched
+
+def request_compact_chunks(words, max_words: int, prompt_static: str):
     chunk_prompt = (
-        f"You're given transcription with energy data:\n"
+        f"You're given transcription with energy data as index-aligned text/start/end/energy arrays:\n"
         f"Max words per caption chunk should not exceed {max_words}.\n\n"
-        f"{json.dumps(transcription)}\n\n"
+        f"{compact_words(words)}\n\n"
         + prompt_static
     )
+    return invoke_llm(chunk_prompt)
+
+def chunk_hybrid(transcription, max_words: int, prompt_static: str, concurrency: int = 4, features=None):
+    """Chunk locally and only ask the LLM about runs the local rules could not split cleanly."""
+    bounds, ambiguous = chunk_boundaries(transcription, max_words, features=features)
+    chunks = build_chunks(transcription, bounds)
+    if not ambiguous:
+        return chunks
+
+    print(f" Sending {len(ambiguous)} ambiguous regions to the LLM")
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        replacements = list(pool.map(
+            lambda r: request_compact_chunks(transcription[r[0]:r[1]], max_words, prompt_static), ambiguous
+        ))
+
+    for (lo, hi), llm_chunks in zip(ambiguous, replacements):
+        lo_ms, hi_ms = transcription[lo]["start"], transcription[hi - 1]["end"]
+        chunks = [c for c in chunks if not lo_ms <= c["start_time"] <= hi_ms]
+        chunks.extend(c for c in llm_chunks if lo_ms <= c["start_time"] <= hi_ms)
+    return sorted(chunks, key=lambda c: c["start_time"])
+
+def chunk_windowed(transcription, max_words: int, prompt_static: str, concurrency: int = 4,
+                   window_words: int = WINDOW_WORDS, overlap_words: int = OVERLAP_WORDS):
+    windows = split_windows(transcription, window_words, overlap_words)
+
+    def chunk_window(window):
+        start, end = window[:2]
+        return request_compact_chunks(transcription[start:end], max_words, prompt_static)
+
+    print(f" Chunking {len(transcription)} words in {len(windows)} windows")
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        window_chunks = list(pool.map(chunk_window, windows))
+    return stitch_windows(transcription, windows, window_chunks, max_words)
+
+def align_chunks(chunks, transcription):
+    """Attach word_times to every chunk and take its start/end from the aligned transcript words."""
+    flat = [str(word) for chunk in chunks for word in chunk.get("words", [])]
+    timed = attach_timestamps(flat, transcription)
+    pos = 0
+    unverified = 0
+    for chunk in chunks:
+        count = len(chunk.get("words", []))
+        chunk["word_times"] = timed[pos:pos + count]
+        pos += count
+        if count and transcription:
+            chunk["start_time"] = chunk["word_times"][0]["start"]
+            chunk["end_time"] = chunk["word_times"][-1]["end"]
+        unverified += sum(1 for word in chunk["word_times"] if not word["verified"])
+    if unverified:
+        print(f"⚠️ {unverified} of {len(flat)} chunk words did not match the transcript exactly")
+    return chunks
+
+def chunk_transcription(transcription_path: str, all_frames_path: str, output_path: str, mode: str = "auto", concurrency: int = 4):
+    transcription = json.load(open(transcription_path, encoding="utf-8"))
+    all_frames = json.load(open(all_frames_path, encoding="utf-8"))
+    features = load_features(transcription_path)
+    prompt_static = Path("prompts/chunking_prompt.txt").read_text(encoding="utf-8")
+
+    max_words = max(len(f.get("words", [])) for f in all_frames)
+    if mode == "auto":
+        mode = "windowed" if len(transcription) > WINDOW_WORDS + OVERLAP_WORDS else "single"
 
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.3)
-    response = llm.invoke(chunk_prompt)
-    chunks = clean_output(response.content)
+    if mode == "windowed":
+        chunks = chunk_windowed(transcription, max_words, prompt_static, concurrency)
+    elif mode == "local":
+        chunks = chunk_locally(transcription, max_words, features=features)
+    elif mode == "hybrid":
+        chunks = chunk_hybrid(transcription, max_words, prompt_static, concurrency, features)
+    elif mode == "single":
+        chunk_prompt = (
+            f"You're given transcription with energy data:\n"
+            f"Max words per caption chunk should not exceed {max_words}.\n\n"
+            f"{json.dumps(transcription)}\n\n"
+            + prompt_static
+        )
+        chunks = invoke_llm(chunk_prompt)
+    else:
+        raise ValueError(f"Unknown chunking mode: {mode}")
 
+    chunks = json.dumps(align_chunks(chunks, transcription), indent=2, ensure_ascii=False)
     Path(output_path).parent.mkdir(exist_ok=True)
     Path(output_path).write_text(chunks, encoding="utf-8")
     print(f" Saved: {output_path}")
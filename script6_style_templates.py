@@ -1,13 +1,83 @@
 import json
 from pathlib import Path
-import hashlib
 import numpy as np
 
-def style_hash(style_dict):
-    relevant = {
-        k: style_dict[k] for k in ["fontname", "fontsize", "primary_colour", "bold", "italic", "outline", "shadow"]
-    }
-    return hashlib.md5(json.dumps(relevant, sort_keys=True).encode()).hexdigest()
+STYLE_FIELDS = ["fontname", "fontsize", "primary_colour", "bold", "italic", "outline", "shadow"]
+MERGE_TOLERANCE = 1.0
+MAX_TEMPLATES = 12
+
+def ass_colour_to_rgb(colour: str):
+    digits = str(colour).upper().replace("&H", "").replace("&", "").rjust(6, "F")[-6:]
+    try:
+        b, g, r = int(digits[0:2], 16), int(digits[2:4], 16), int(digits[4:6], 16)
+    except ValueError:
+        return 1.0, 1.0, 1.0
+    return r / 255.0, g / 255.0, b / 255.0
+
+def rgb_to_lab(rgb):
+    # sRGB (D65) → CIE Lab, row-wise.
+    rgb = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = rgb @ np.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505],
+    ]) / np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+def style_key(style):
+    # Font, size tier and weight/slant are exact: merging them would erase the distinctions
+    # the templates exist to carry. Only colour, outline and shadow jitter is clustered.
+    return style["fontname"], style["fontsize"], style["bold"] != 0, style["italic"] != 0
+
+def style_vectors(styles):
+    """Embed styles so a Euclidean distance of 1 is roughly one "just different" step:
+    ~10 ΔE of colour or 2px of outline/shadow."""
+    rgb = np.array([ass_colour_to_rgb(s["primary_colour"]) for s in styles], dtype=np.float64).reshape(-1, 3)
+    strokes = np.array([[s["outline"], s["shadow"]] for s in styles], dtype=np.float64).reshape(-1, 2)
+    return np.hstack([rgb_to_lab(rgb) / 10.0, strokes / 2.0])
+
+def cluster_styles(styles, counts, tolerance: float = MERGE_TOLERANCE, max_templates: int = MAX_TEMPLATES):
+    """Map each distinct style to a representative, most frequent first.
+
+    Styles only merge when style_key() is identical. The most used unassigned style
+    becomes a cluster centre and takes every unassigned style within tolerance of it, so
+    every member is close to the template that is actually emitted (no chaining through
+    neighbours). If more than max_templates clusters remain, the rarest fold into the
+    nearest kept cluster with the same key; clusters with no such partner stay separate.
+    """
+    n = len(styles)
+    if n == 0:
+        return np.zeros(0, dtype=int)
+    counts = np.asarray(counts)
+    order = np.argsort(-counts, kind="stable")
+    vectors = style_vectors([styles[i] for i in order])
+    keys = [style_key(styles[i]) for i in order]
+    key_ids = np.array([{k: j for j, k in enumerate(dict.fromkeys(keys))}[k] for k in keys])
+
+    distance = np.sqrt(((vectors[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2))
+    same_key = key_ids[:, None] == key_ids[None, :]
+
+    parent = np.full(n, -1)
+    for centre in range(n):
+        if parent[centre] < 0:
+            parent[(parent < 0) & same_key[centre] & (distance[centre] <= tolerance)] = centre
+
+    roots = np.unique(parent)
+    if max_templates and len(roots) > max_templates:
+        weight = np.bincount(parent, weights=counts[order], minlength=n)
+        kept = roots[np.argsort(-weight[roots], kind="stable")[:max_templates]]
+        for root in np.setdiff1d(roots, kept):
+            partners = kept[same_key[root, kept]]
+            if len(partners):
+                parent[parent == root] = partners[distance[root, partners].argmin()]
+        remaining = len(np.unique(parent))
+        if remaining > max_templates:
+            print(f"⚠️ {remaining} templates exceed the {max_templates} limit; distinct font/size/weight kept apart")
+
+    assignment = np.empty(n, dtype=int)
+    assignment[order] = order[parent]
+    return assignment
 
 def normalize_font_sizes(frames):
     sizes = []
@@ -41,69 +111,60 @@ def normalize_font_sizes(frames):
 
     return size_map
 
-def extract_styles(frames_path: str, template_output: str, map_output: str):
+def word_style(word, size_map):
+    raw_size = word.get("fontsize", 0)
+    return {
+        "fontname": word.get("fontname", ""),
+        "fontsize": size_map.get(raw_size, 32),  # default to 'm' size if missing
+        "primary_colour": word.get("primary_colour", ""),
+        "bold": word.get("bold", 0),
+        "italic": word.get("italic", 0),
+        "outline": word.get("outline", 0),
+        "shadow": word.get("shadow", 0),
+    }
+
+def extract_styles(frames_path: str, template_output: str, map_output: str,
+                   tolerance: float = MERGE_TOLERANCE, max_templates: int = MAX_TEMPLATES):
     frames = json.load(open(frames_path, encoding="utf-8"))
 
     size_map = normalize_font_sizes(frames)
 
+    # Position is not part of a style's identity; it stays per word in the frame map.
+    distinct = {}
+    counts = []
+    frame_keys = []
+    for frame in frames:
+        keys = []
+        for word in frame["words"]:
+            style = word_style(word, size_map)
+            key = tuple(json.dumps(style[k]) for k in STYLE_FIELDS)
+            if key not in distinct:
+                distinct[key] = (len(distinct), style)
+                counts.append(0)
+            counts[distinct[key][0]] += 1
+            keys.append(distinct[key][0])
+        frame_keys.append(keys)
+
+    styles = [style for _, style in distinct.values()]
+    assignment = cluster_styles(styles, counts, tolerance, max_templates)
+
     style_templates = []
-    template_lookup = {}
-    frame_style_map = {}
-    style_index = 1
+    template_names = {}
+    for rep in dict.fromkeys(assignment.tolist()):
+        template_names[rep] = f"Style_{len(style_templates) + 1}"
+        style_templates.append({"name": template_names[rep], **styles[rep]})
 
-    for frame in frames:
+    frame_style_map = {}
+    for frame, keys in zip(frames, frame_keys):
         fname = frame["frame"]
         frame_num = int(Path(fname).stem.split("_")[1])
-        frame_time_ms = frame_num * (1000 // 2)
-
-        styles = []
-        positions = []
-
-        for word in frame["words"]:
-            x, y = word.get("relative_position", [0, 0])
-            raw_size = word.get("fontsize", 0)
-            normalized_size = size_map.get(raw_size, 32)  # default to 'm' size if missing
-
-            style_key = {
-                "fontname": word.get("fontname", ""),
-                "fontsize": normalized_size,
-                "primary_colour": word.get("primary_colour", ""),
-                "bold": word.get("bold", 0),
-                "italic": word.get("italic", 0),
-                "outline": word.get("outline", 0),
-                "shadow": word.get("shadow", 0),
-                "x": x,
-                "y": y
-            }
-
-            h = style_hash(style_key)
-            if h not in template_lookup:
-                style_name = f"Style_{style_index}"
-                style_index += 1
-                template = {
-                    "name": style_name,
-                    "fontname": style_key["fontname"],
-                    "fontsize": style_key["fontsize"],
-                    "primary_colour": style_key["primary_colour"],
-                    "bold": style_key["bold"],
-                    "italic": style_key["italic"],
-                    "outline": style_key["outline"],
-                    "shadow": style_key["shadow"],
-                    "relative_position": [x, y]
-                }
-                template_lookup[h] = style_name
-                style_templates.append(template)
-
-            styles.append(template_lookup[h])
-            positions.append([x, y])
-
         frame_style_map[fname] = {
-            "time_ms": frame_time_ms,
-            "styles": styles,
-            "positions": positions
+            "time_ms": frame.get("time_ms", frame_num * (1000 // 2)),
+            "styles": [template_names[int(assignment[k])] for k in keys],
+            "positions": [list(word.get("relative_position", [0, 0])) for word in frame["words"]]
         }
 
     Path(template_output).write_text(json.dumps(style_templates, indent=2), encoding="utf-8")
     Path(map_output).write_text(json.dumps(frame_style_map, indent=2), encoding="utf-8")
 
-    print("✅ Saved style templates and mapping with normalized font sizes.")
+    print(f"✅ Saved {len(style_templates)} style templates (from {len(styles)} distinct word styles) and mapping.")
@@ -1,4 +1,5 @@
 import json
+import bisect
 from pathlib import Path
 
 def ms_to_ass_time(ms):
@@ -8,75 +9,56 @@ def ms_to_ass_time(ms):
     cs = (ms % 1000) // 10
     return f"{h}:{m:02}:{s:02}.{cs:02}"
 
-def generate_ass_file(chunks_path: str, style_seq_path: str, templates_path: str, output_path: str, log_path: str):
-    chunks = json.load(open(chunks_path, encoding="utf-8"))
-    style_seq = json.load(open(style_seq_path, encoding="utf-8"))
-    templates = json.load(open(templates_path, encoding="utf-8"))
-
-    template_lookup = {t["name"]: t for t in templates}
-
-    def find_matching_frame(avg_time, word_count):
-        closest_frame = None
-        closest_diff = float("inf")
-        for frame_name, data in style_seq.items():
-            if len(data["styles"]) != word_count:
-                continue
-            frame_time = data.get("time_ms", None)
-            if frame_time is None:
-                continue
-            diff = abs(frame_time - avg_time)
-            if diff < closest_diff:
-                closest_diff = diff
-                closest_frame = (frame_name, data)
-        return closest_frame
-
-    ass_lines = []
-    log_lines = []
-
-    for chunk in chunks:
-        start = chunk["start_time"]
-        end = chunk["end_time"]
-        words = chunk["words"]
-        avg_time = (start + end) // 2
-
-        matched = find_matching_frame(avg_time, len(words))
-        if not matched:
-            print(f"⚠️ Skipping chunk: {chunk['chunk_text']}")
+def build_style_index(style_seq):
+    """Group frames by word count, each group sorted by time_ms for bisection."""
+    groups = {}
+    for frame_name, data in style_seq.items():
+        frame_time = data.get("time_ms", None)
+        if frame_time is None:
             continue
-
-        frame_name, data = matched
-        frame_styles = data["styles"]
-        frame_positions = data["positions"]
-
-        ass_text = ""
-        last_row = None
-        log_entry = f"Chunk: \"{chunk['chunk_text']}\"\nFrame: {frame_name} @ {data['time_ms']} ms\n"
-
-        for word, style_name, pos in zip(words, frame_styles, frame_positions):
-            row = pos[0]
-            if last_row is not None and row != last_row:
-                ass_text += r"\N"
-
-            t = template_lookup[style_name]
-            override = f"{{\\fn{t['fontname']}\\fs{t['fontsize']}\\c{t['primary_colour']}"
-            if t['bold'] == -1:
-                override += "\\b1"
-            if t['italic'] == -1:
-                override += "\\i1"
-            if t['shadow'] > 0:
-                override += f"\\shad{t['shadow']}"
-            override += "}"
-
-            ass_text += override + word + " "
-            last_row = row
-            log_entry += f"  - {word}: {style_name}\n"
-
-        ass_text = ass_text.strip()
-        ass_line = f"Dialogue: 0,{ms_to_ass_time(start)},{ms_to_ass_time(end)},Default,,0,0,0,,{ass_text}"
-        ass_lines.append(ass_line)
-        log_lines.append(log_entry + "\n")
-
-    ass_header = """[Script Info]
+        groups.setdefault(len(data["styles"]), []).append((frame_time, frame_name))
+    index = {}
+    for word_count, entries in groups.items():
+        entries.sort(key=lambda entry: entry[0])
+        index[word_count] = ([t for t, _ in entries], [name for _, name in entries])
+    return index
+
+def closest_in_group(group, avg_time):
+    times, names = group
+    i = bisect.bisect_left(times, avg_time)
+    candidates = [j for j in (i - 1, i) if 0 <= j < len(times)]
+    best = min(candidates, key=lambda j: (abs(times[j] - avg_time), j))
+    return names[best], abs(times[best] - avg_time)
+
+def find_matching_frame(style_index, style_seq, avg_time, word_count, fallback="nearest"):
+    if word_count in style_index:
+        frame_name, _ = closest_in_group(style_index[word_count], avg_time)
+        return frame_name, style_seq[frame_name]
+    if fallback != "nearest" or not style_index:
+        return None
+    # Nearest word count first; on a tie prefer the larger frame so no word is left without a style.
+    count = min(style_index, key=lambda c: (abs(c - word_count), -c))
+    frame_name, _ = closest_in_group(style_index[count], avg_time)
+    return frame_name, style_seq[frame_name]
+
+def fit_styles(styles, positions, word_count):
+    """Stretch or compress a frame's per-word styles onto word_count words, keeping their order."""
+    if len(styles) == word_count:
+        return styles, positions
+    picks = [i * len(styles) // word_count for i in range(word_count)]
+    return [styles[i] for i in picks], [positions[i] for i in picks]
+
+def style_chunk(style_index, style_seq, template_lookup, avg_time, word_count, fallback="nearest"):
+    """Return (frame_name, frame_data, styles, positions) for a chunk, or None if no frame fits."""
+    matched = find_matching_frame(style_index, style_seq, avg_time, word_count, fallback)
+    if not matched:
+        return None
+    frame_name, data = matched
+    styles, positions = fit_styles(data["styles"], data["positions"], word_count)
+    styles = [name if name in template_lookup else "Default" for name in styles]
+    return frame_name, data, styles, positions
+
+ASS_HEADER = """[Script Info]
 Title: Styled Subtitles
 ScriptType: v4.00+
 Collisions: Normal
@@ -87,13 +69,99 @@ Timer: 100.0000
 [V4+ Styles]
 Format: Name, Fontname, Fontsize, PrimaryColour, Bold, Italic, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
 Style: Default,Arial,24,&HFFFFFF,-1,0,0,0,2,10,10,10,1
+"""
 
+EVENTS_HEADER = """
 [Events]
 Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """
 
-    Path(output_path).write_text(ass_header + "\n" + "\n".join(ass_lines), encoding="utf-8")
-    Path(log_path).write_text("\n".join(log_lines), encoding="utf-8")
+DEFAULT_TEMPLATE = {"italic": 0, "shadow": 0}
+
+def style_line(t):
+    """A template as a named style that renders exactly like the old Default-plus-overrides tags.
+
+    Those tags set font, size and colour, kept Default's bold and zero outline, and only
+    ever switched italic and shadow on, so the style carries the same values.
+    """
+    # Commas separate fields in a Style line, so they cannot appear in the font name.
+    fontname = str(t["fontname"]).replace(",", " ")
+    italic = -1 if t["italic"] == -1 else 0
+    shadow = t["shadow"] if t["shadow"] > 0 else 0
+    return (
+        f"Style: {t['name']},{fontname},{t['fontsize']},{t['primary_colour']},"
+        f"-1,{italic},0,{shadow},2,10,10,10,1\n"
+    )
+
+def ass_header(templates):
+    return ASS_HEADER + "".join(style_line(t) for t in templates) + EVENTS_HEADER + "\n"
+
+def dialogue_line(start, end, words, styles, positions, template_lookup=None):
+    """One Dialogue event: the first word's style is the line style, later changes use \\r resets.
+
+    The old per-word overrides never switched italic or shadow back off within a line, so
+    after a reset both are re-applied whenever an earlier word had turned them on.
+    """
+    template_lookup = template_lookup or {}
+    text = ""
+    current = styles[0]
+    last_row = None
+    italic, shadow = False, 0
+    for word, style_name, pos in zip(words, styles, positions):
+        row = pos[0]
+        if last_row is not None and row != last_row:
+            text += r"\N"
+        t = template_lookup.get(style_name, DEFAULT_TEMPLATE)
+        if style_name != current:
+            override = f"\\r{style_name}"
+            if italic and t["italic"] != -1:
+                override += "\\i1"
+            if shadow > 0 and t["shadow"] <= 0:
+                override += f"\\shad{shadow}"
+            text += "{" + override + "}"
+            current = style_name
+        italic = italic or t["italic"] == -1
+        shadow = t["shadow"] if t["shadow"] > 0 else shadow
+        text += word + " "
+        last_row = row
+    return f"Dialogue: 0,{ms_to_ass_time(start)},{ms_to_ass_time(end)},{styles[0]},,0,0,0,,{text.strip()}\n"
+
+def generate_ass_file(chunks_path: str, style_seq_path: str, templates_path: str, output_path: str, log_path: str,
+                      fallback: str = "nearest"):
+    chunks = json.load(open(chunks_path, encoding="utf-8"))
+    style_seq = json.load(open(style_seq_path, encoding="utf-8"))
+    templates = json.load(open(templates_path, encoding="utf-8"))
+
+    template_lookup = {t["name"]: t for t in templates}
+    style_index = build_style_index(style_seq)
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as ass_file, open(log_path, "w", encoding="utf-8") as log_file:
+        ass_file.write(ass_header(templates))
+        first_log = True
+
+        for chunk in chunks:
+            start = chunk["start_time"]
+            end = chunk["end_time"]
+            words = chunk["words"]
+            avg_time = (start + end) // 2
+            if not words:
+                continue
+
+            matched = style_chunk(style_index, style_seq, template_lookup, avg_time, len(words), fallback)
+            if not matched:
+                print(f"⚠️ Skipping chunk: {chunk['chunk_text']}")
+                continue
+
+            frame_name, data, frame_styles, frame_positions = matched
+
+            log_entry = f"Chunk: \"{chunk['chunk_text']}\"\nFrame: {frame_name} @ {data['time_ms']} ms\n"
+            for word, style_name in zip(words, frame_styles):
+                log_entry += f"  - {word}: {style_name}\n"
+
+            ass_file.write(dialogue_line(start, end, words, frame_styles, frame_positions, template_lookup))
+            log_file.write(("" if first_log else "\n") + log_entry + "\n")
+            first_log = False
 
     print(f" .ASS saved: {output_path}")
     print(f" Logs saved: {log_path}")
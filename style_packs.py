@@ -0,0 +1,200 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from pipeline import hash_path, local_imports
+from response_cache import hash_file
+
+PACKS_DIR = os.getenv("CAPLY_STYLE_PACKS", "style_packs")
+PACK_VERSION = 1
+PACK_SUFFIX = ".stylepack.json.gz"
+FRAME_STYLE_PROMPT = os.path.join("prompts", "frame_style_prompt.txt")
+# Entry modules of the reference analysis stages; their repo-local imports are followed.
+ANALYSIS_MODULES = ("script2_extract_frames.py", "script3_style_detection.py", "script4_filter_frames.py",
+                    "script6_style_templates.py")
+
+def analysis_fingerprint(prompt_path: str = FRAME_STYLE_PROMPT) -> str:
+    """sha256 over the frame style prompt and all code reference analysis runs.
+
+    Files are identified by name, not location, so a pack made from the same checkout
+    elsewhere still matches.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    sources = set()
+    for name in ANALYSIS_MODULES:
+        path = os.path.join(root, name)
+        sources.update([path, *local_imports(path)])
+    digest = hashlib.sha256()
+    for path in sorted(sources) + [prompt_path]:
+        digest.update(os.path.basename(path).encode("utf-8"))
+        digest.update(hash_path(path).encode("utf-8"))
+    return digest.hexdigest()
+
+class StylePackStore:
+    """Reference styles keyed by the reference video's sha256.
+
+    A pack holds everything later stages read from reference analysis: filtered frames,
+    templates, the style sequence and the largest caption size. Packs are gzipped JSON
+    next to a small index.json so listing never opens the packs themselves. A pack only
+    matches while the frame style prompt and analysis code are unchanged (see
+    analysis_fingerprint); otherwise the reference is analyzed again.
+    """
+
+    def __init__(self, root: str = PACKS_DIR):
+        self.root = Path(root)
+        self.index_path = self.root / "index.json"
+        self.lock = threading.Lock()
+
+    def path_for(self, video_hash: str) -> str:
+        return str(self.root / f"{video_hash}{PACK_SUFFIX}")
+
+    def _read_index(self) -> dict:
+        if not self.index_path.exists():
+            return {}
+        return json.loads(self.index_path.read_text(encoding="utf-8"))
+
+    def _write_index(self, index: dict):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(index, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+
+    def list(self):
+        return sorted(self._read_index().values(), key=lambda entry: entry["created"])
+
+    def find(self, video_path: str, video_hash: str = None):
+        video_hash = video_hash or hash_file(video_path)
+        entry = self._read_index().get(video_hash)
+        if not entry or entry["version"] != PACK_VERSION or not os.path.exists(self.path_for(video_hash)):
+            return None
+        if entry.get("analysis") != analysis_fingerprint():
+            print(f" Style pack {video_hash[:12]} was made with a different prompt or analysis code, ignoring it")
+            return None
+        return self.path_for(video_hash)
+
+    def load(self, video_hash: str) -> dict:
+        with gzip.open(self.path_for(video_hash), "rt", encoding="utf-8") as f:
+            pack = json.load(f)
+        if pack.get("version") != PACK_VERSION:
+            raise ValueError(f"Style pack {video_hash[:12]} has version {pack.get('version')}, expected {PACK_VERSION}")
+        return pack
+
+    def _add(self, pack: dict) -> str:
+        path = self.path_for(pack["video_sha256"])
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+            json.dump(pack, f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        with self.lock:
+            index = self._read_index()
+            index[pack["video_sha256"]] = {
+                "video_sha256": pack["video_sha256"],
+                "name": pack["name"],
+                "version": pack["version"],
+                "analysis": pack.get("analysis"),
+                "created": pack["created"],
+                "templates": len(pack["templates"]),
+                "frames": len(pack["style_sequence"]),
+            }
+            self._write_index(index)
+        return path
+
+    def save(self, video_path: str, filtered_frames_path: str, templates_path: str, style_seq_path: str,
+             name: str = None) -> str:
+        filtered_frames = json.load(open(filtered_frames_path, encoding="utf-8"))
+        pack = {
+            "version": PACK_VERSION,
+            "video_sha256": hash_file(video_path),
+            "analysis": analysis_fingerprint(),
+            "name": name or Path(video_path).stem,
+            "created": time.time(),
+            "max_words": max((len(f.get("words", [])) for f in filtered_frames), default=0),
+            "filtered_frames": filtered_frames,
+            "templates": json.load(open(templates_path, encoding="utf-8")),
+            "style_sequence": json.load(open(style_seq_path, encoding="utf-8")),
+        }
+        return self._add(pack)
+
+    def export(self, video_hash: str, destination: str) -> str:
+        shutil.copyfile(self.path_for(video_hash), destination)
+        return destination
+
+    def import_pack(self, source: str) -> str:
+        with gzip.open(source, "rt", encoding="utf-8") as f:
+            pack = json.load(f)
+        if pack.get("version") != PACK_VERSION:
+            raise ValueError(f"{source} has pack version {pack.get('version')}, expected {PACK_VERSION}")
+        self._add(pack)
+        return pack["video_sha256"]
+
+    def remove(self, video_hash: str):
+        with self.lock:
+            index = self._read_index()
+            index.pop(video_hash, None)
+            self._write_index(index)
+        if os.path.exists(self.path_for(video_hash)):
+            os.remove(self.path_for(video_hash))
+
+def materialize(pack: dict, filtered_frames_path: str, templates_path: str, style_seq_path: str):
+    """Write a pack back out as the files script5 and script7 read."""
+    for path, key in ((filtered_frames_path, "filtered_frames"), (templates_path, "templates"),
+                      (style_seq_path, "style_sequence")):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(pack[key], indent=2, ensure_ascii=False), encoding="utf-8")
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store() -> StylePackStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = StylePackStore()
+        return _store
+
+def save_style_pack(video_path: str, filtered_frames_path: str, templates_path: str, style_seq_path: str):
+    path = get_store().save(video_path, filtered_frames_path, templates_path, style_seq_path)
+    print(f" Saved style pack: {path}")
+
+def load_style_pack(pack_path: str, filtered_frames_path: str, templates_path: str, style_seq_path: str):
+    video_hash = Path(pack_path).name[:-len(PACK_SUFFIX)]
+    materialize(get_store().load(video_hash), filtered_frames_path, templates_path, style_seq_path)
+    print(f" Loaded style pack {video_hash[:12]} instead of re-analyzing the reference")
+
+def resolve_hash(prefix: str) -> str:
+    matches = [entry["video_sha256"] for entry in get_store().list() if entry["video_sha256"].startswith(prefix)]
+    if len(matches) != 1:
+        raise ValueError(f"'{prefix}' matches {len(matches)} style packs")
+    return matches[0]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage stored reference style packs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    export_cmd = commands.add_parser("export")
+    export_cmd.add_argument("hash", help="pack hash or unique prefix")
+    export_cmd.add_argument("destination")
+    import_cmd = commands.add_parser("import")
+    import_cmd.add_argument("source")
+    remove_cmd = commands.add_parser("remove")
+    remove_cmd.add_argument("hash", help="pack hash or unique prefix")
+    cli = parser.parse_args()
+
+    store = get_store()
+    if cli.command == "list":
+        for entry in store.list():
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["created"]))
+            print(f"  {entry['video_sha256'][:12]}  {entry['name']:<24} {entry['templates']:>3} templates  "
+                  f"{entry['frames']:>4} frames  {created}")
+    elif cli.command == "export":
+        print(f" Exported to {store.export(resolve_hash(cli.hash), cli.destination)}")
+    elif cli.command == "import":
+        print(f" Imported style pack {store.import_pack(cli.source)[:12]}")
+    elif cli.command == "remove":
+        store.remove(resolve_hash(cli.hash))
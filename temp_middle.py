@@ -1,5 +1,7 @@
 import json
 
+from alignment import attach_timestamps
+
 # === Load styled chunk data ===
 with open("styled_output.json", "r", encoding="utf-8") as f:
     styled_chunks = json.load(f)
@@ -8,33 +10,23 @@ with open("styled_output.json", "r", encoding="utf-8") as f:
 with open("data/input_transcription_with_energy.json", "r", encoding="utf-8") as f:
     transcript_words = json.load(f)
 
-# Flatten and normalize the transcription text for matching
-transcript_queue = transcript_words.copy()
-current_index = 0
+# Align all chunk words against the transcript at once; extra, missing or merged
+# words only leave those words unverified instead of derailing the rest.
+flat_words = [word["word"] for chunk in styled_chunks for word in chunk["words"]]
+timed_words = iter(attach_timestamps(flat_words, transcript_words))
 
 for chunk in styled_chunks:
     chunk_words = chunk["words"]
     for word in chunk_words:
-        target_word = word["word"].strip().lower()
-
-        # Match each word in order
-        while current_index < len(transcript_queue):
-            transcript_word = transcript_queue[current_index]
-            current_index += 1
-
-            trans_text = transcript_word["text"].strip().lower()
-
-            # Match ignoring trailing punctuation like ".", ",", "?" etc.
-            if trans_text.rstrip(".,?!") == target_word.rstrip(".,?!"):
-                word["start"] = transcript_word["start"]
-                word["end"] = transcript_word["end"]
-                break
-        else:
-            raise ValueError(f"Could not find match for word '{target_word}'")
+        timed = next(timed_words)
+        word["start"] = timed["start"]
+        word["end"] = timed["end"]
+        word["verified"] = timed["verified"]
 
     # Update chunk start and end
-    chunk["start"] = chunk_words[0]["start"]
-    chunk["end"] = chunk_words[-1]["end"]
+    if chunk_words:
+        chunk["start"] = chunk_words[0]["start"]
+        chunk["end"] = chunk_words[-1]["end"]
 
 # === Save output ===
 with open("styled_chunks_with_timestamps.json", "w", encoding="utf-8") as f:
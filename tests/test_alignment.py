@@ -0,0 +1,35 @@
+from alignment import align_tokens, attach_timestamps
+
+def words(count, prefix="w"):
+    return [f"{prefix}{i}" for i in range(count)]
+
+def test_large_dropped_span_keeps_sync():
+    target = words(2000)
+    source = target[:1000] + target[1200:]
+    matches, exact = align_tokens(source, target)
+    assert sum(exact) == 1800
+    assert matches == list(range(1000)) + list(range(1200, 2000))
+
+def test_hallucinated_span_is_left_unmatched():
+    target = words(2000)
+    source = target[:500] + words(300, "extra") + target[500:]
+    matches, exact = align_tokens(source, target)
+    assert sum(exact) == 2000
+    assert matches[500:800] == [None] * 300
+    assert matches[800:] == list(range(500, 2000))
+
+def test_opposite_spans_fall_back_to_a_wider_band():
+    # Same length overall, so the band is not widened up front; the path has to leave it.
+    target = words(1500)
+    source = words(150, "extra") + target[:1350]
+    matches, exact = align_tokens(source, target)
+    assert sum(exact) == 1350
+    assert matches[150:] == list(range(1350))
+
+def test_merged_words_keep_their_neighbours_verified():
+    transcript = [{"text": t, "start": i * 100, "end": i * 100 + 90}
+                  for i, t in enumerate(["we", "can", "not", "stop", "now"])]
+    timed = attach_timestamps(["We", "cannot", "stop", "now!"], transcript)
+    assert [w["verified"] for w in timed] == [True, False, True, True]
+    assert timed[1]["start"] >= timed[0]["end"] and timed[1]["end"] <= timed[2]["start"]
+    assert (timed[2]["start"], timed[3]["end"]) == (300, 490)
@@ -0,0 +1,13 @@
+import os
+
+from batch import clip_output_dirs
+
+def test_same_named_clips_get_separate_directories(tmp_path):
+    clips = [str(tmp_path / "a" / "x.mp4"), str(tmp_path / "b" / "x.mp4"), str(tmp_path / "b" / "y.mp4")]
+    dirs = clip_output_dirs(clips, "out")
+    assert dirs == [os.path.join("out", "a", "x"), os.path.join("out", "b", "x"), os.path.join("out", "b", "y")]
+
+def test_single_folder_keeps_plain_names_and_splits_extensions(tmp_path):
+    clips = [str(tmp_path / "x.mp4"), str(tmp_path / "x.mov"), str(tmp_path / "z.mkv")]
+    assert clip_output_dirs(clips, "out") == [os.path.join("out", "x_mp4"), os.path.join("out", "x_mov"),
+                                              os.path.join("out", "z")]
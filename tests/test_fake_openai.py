@@ -0,0 +1,102 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+import pytest
+
+import api_clients
+import script3_style_detection as detection
+from response_cache import ResponseCache
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    """Chat completions in the OpenAI wire format, with rate-limit headers and one 429 up front."""
+
+    requests = []
+    throttle_first = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        type(self).requests.append(body)
+        if type(self).throttle_first:
+            type(self).throttle_first = False
+            self._send(429, {"error": {"message": "slow down", "type": "requests"}}, {"retry-after": "0"})
+            return
+
+        texts = [part["text"] for part in body["messages"][-1]["content"] if part["type"] == "text"]
+        frame_ids = [m.group(1) for m in map(re.compile(r"^Frame (\d+)$").match, texts) if m]
+        if frame_ids:
+            reply = {"frames": {i: {"words": [{"text": f"frame{i}", "color": "#FFFF00"}]} for i in frame_ids}}
+        else:
+            reply = {"words": [{"text": "single", "color": "#FFFF00"}]}
+        completion = {
+            "id": f"chatcmpl-{len(type(self).requests)}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "```json\n" + json.dumps(reply) + "\n```"}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+        }
+        self._send(200, completion, {"x-ratelimit-limit-requests": "1200", "x-ratelimit-remaining-requests": "1199",
+                                     "x-ratelimit-reset-requests": "50ms"})
+
+    def _send(self, status, payload, headers):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    FakeOpenAI.requests = []
+    FakeOpenAI.throttle_first = True
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(api_clients, "OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setattr(api_clients, "_openai_client", None)
+    yield FakeOpenAI
+    server.shutdown()
+    server.server_close()
+
+def test_analyze_frames_against_a_fake_openai_server(tmp_path, monkeypatch, fake_openai):
+    frames = tmp_path / "frames"
+    frames.mkdir()
+    for n in (1, 2, 3):
+        noise = np.random.default_rng(n).integers(0, 255, (60, 120, 3), dtype=np.uint8)
+        cv2.imwrite(str(frames / f"frame_{n:04d}.png"), noise)
+
+    limiters = []
+    make_limiter = detection.make_limiter
+    monkeypatch.setattr(detection, "make_limiter", lambda rpm=None: limiters.append(make_limiter(rpm)) or limiters[-1])
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(detection, "get_cache", lambda: cache)
+    monkeypatch.setattr(detection, "generate_prompt", lambda: "Describe the caption style.")
+
+    output = tmp_path / "all_frames.json"
+    detection.analyze_frames(str(frames), str(output), batch_size=2)
+
+    results = json.loads(output.read_text())
+    assert [r["frame"] for r in results] == ["frame_0001.png", "frame_0002.png", "frame_0003.png"]
+    assert [r["words"][0]["text"] for r in results] == ["frame0", "frame1", "single"]
+    assert results[0]["words"][0]["primary_colour"] == detection.hex_to_ass_color("#FFFF00")
+    # The batch request was throttled once and retried, then the single-frame request followed.
+    assert len(fake_openai.requests) == 3
+    assert fake_openai.requests[0] == fake_openai.requests[1]
+    assert all(r["model"] == detection.STYLE_MODEL for r in fake_openai.requests)
+    # The adaptive limiter took its rate from x-ratelimit-limit-requests.
+    assert limiters[0].rate == 1200 / 60.0
+
+    detection.analyze_frames(str(frames), str(output), batch_size=2)
+    assert len(fake_openai.requests) == 3
@@ -0,0 +1,17 @@
+from script7_generate_ass import dialogue_line, style_line
+
+TEMPLATES = {
+    "Style_1": dict(name="Style_1", fontname="Poppins", fontsize=40, primary_colour="&H00FFFF",
+                    bold=0, italic=-1, outline=3, shadow=0),
+    "Style_2": dict(name="Style_2", fontname="Poppins", fontsize=56, primary_colour="&HFF00FF",
+                    bold=0, italic=0, outline=2, shadow=4),
+}
+
+def test_style_line_keeps_old_default_bold_and_outline():
+    assert style_line(TEMPLATES["Style_1"]) == "Style: Style_1,Poppins,40,&H00FFFF,-1,-1,0,0,2,10,10,10,1\n"
+    assert style_line(TEMPLATES["Style_2"]) == "Style: Style_2,Poppins,56,&HFF00FF,-1,0,0,4,2,10,10,10,1\n"
+
+def test_italic_and_shadow_carry_across_resets():
+    line = dialogue_line(0, 1000, ["a", "b", "c"], ["Style_1", "Style_2", "Style_1"], [[0, 0], [0, 1], [0, 2]],
+                         TEMPLATES)
+    assert line.endswith(r",Style_1,,0,0,0,,a {\rStyle_2\i1}b {\rStyle_1\shad4}c" + "\n")
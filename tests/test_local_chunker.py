@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from audio_features import AudioFeatureIndex, features_path, load_features
+from local_chunker import chunk_boundaries, chunk_locally
+
+def make_words(n, gap=30):
+    return [{"text": f"w{i}", "start": i * (200 + gap), "end": i * (200 + gap) + 200, "energy": 0.5}
+            for i in range(n)]
+
+@pytest.mark.parametrize("n", [1, 2, 3, 7, 12])
+def test_single_word_captions(n):
+    chunks = chunk_locally(make_words(n), max_words=1)
+    assert [c["words"] for c in chunks] == [[f"w{i}"] for i in range(n)]
+
+@pytest.mark.parametrize("max_words", [1, 2, 3, 5])
+@pytest.mark.parametrize("n", [2, 3, 7, 12, 40])
+def test_chunks_respect_cap_and_cover_every_word(max_words, n):
+    bounds, _ = chunk_boundaries(make_words(n), max_words, min_words=2)
+    assert all(0 < hi - lo <= max_words for lo, hi in bounds)
+    assert [i for lo, hi in bounds for i in range(lo, hi)] == list(range(n))
+
+def test_non_positive_max_words_is_rejected():
+    with pytest.raises(ValueError):
+        chunk_locally(make_words(3), max_words=0)
+
+def test_saved_audio_features_move_cuts_to_silent_gaps(tmp_path):
+    words = make_words(6)
+    assert chunk_boundaries(words, max_words=3)[0] == [(0, 2), (2, 4), (4, 6)]
+
+    # Speech is continuous except for a real pause in the gap before word 3.
+    samples = np.full(16 * 1400, 0.5, dtype=np.float32)
+    samples[16 * words[2]["end"]:16 * words[3]["start"]] = 0.0
+    index = AudioFeatureIndex()
+    index.update(samples)
+    transcript = tmp_path / "transcription.json"
+    index.finalize().save(features_path(str(transcript)))
+
+    bounds, _ = chunk_boundaries(words, max_words=3, features=load_features(str(transcript)))
+    assert bounds == [(0, 3), (3, 6)]
+    assert load_features(str(tmp_path / "other.json")) is None
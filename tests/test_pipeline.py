@@ -0,0 +1,28 @@
+import os
+
+from pipeline import FingerprintStore, Stage, local_imports, run_pipeline
+
+def test_local_imports_follow_transitive_repo_modules(tmp_path):
+    (tmp_path / "stage.py").write_text("import json\nfrom helper import f\n")
+    (tmp_path / "helper.py").write_text("import numpy as np\nimport leaf\ndef f(): pass\n")
+    (tmp_path / "leaf.py").write_text("")
+    (tmp_path / "unused.py").write_text("")
+
+    found = [os.path.basename(p) for p in local_imports(str(tmp_path / "stage.py"))]
+    assert found == ["helper.py", "leaf.py"]
+
+def write_marker(path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("x")
+
+def test_skipped_stage_reports_up_to_date(tmp_path, capsys):
+    output = tmp_path / "out.txt"
+    stages = [Stage("write", write_marker, [], [str(output)], args=(str(output),))]
+    store = FingerprintStore(str(tmp_path / "fingerprints.json"))
+
+    run_pipeline(stages, store=store)
+    assert "✔ write finished" in capsys.readouterr().out
+    run_pipeline(stages, store=store)
+    out = capsys.readouterr().out
+    assert "write skipped (up to date)" in out
+    assert "finished" not in out
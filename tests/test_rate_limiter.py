@@ -0,0 +1,18 @@
+from rate_limiter import TokenBucket
+
+def test_adaptive_bucket_follows_limit_header():
+    limiter = TokenBucket(500 / 60.0, adaptive=True)
+    limiter.update_from_headers({"x-ratelimit-limit-requests": "30", "x-ratelimit-remaining-requests": "29"})
+    assert limiter.rate == 0.5
+    assert limiter.capacity == 1.0
+    assert limiter.tokens <= 1.0
+
+def test_explicit_rate_ignores_limit_header():
+    limiter = TokenBucket(2.0)
+    limiter.update_from_headers({"x-ratelimit-limit-requests": "6000"})
+    assert limiter.rate == 2.0
+
+def test_remaining_requests_seed_the_bucket():
+    limiter = TokenBucket(10.0, adaptive=True)
+    limiter.update_from_headers({"x-ratelimit-remaining-requests": "3"})
+    assert limiter.tokens == 3
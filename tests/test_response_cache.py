@@ -0,0 +1,25 @@
+import json
+
+import pytest
+
+from response_cache import ResponseCache
+
+def test_rejected_reply_is_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    replies = iter(['{"words": [', '{"words": []}'])
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return next(replies)
+
+    with pytest.raises(json.JSONDecodeError):
+        cache.cached("frame_style", "img", "model", "prompt", {}, compute, parse=json.loads)
+    assert cache.cached("frame_style", "img", "model", "prompt", {}, compute, parse=json.loads) == {"words": []}
+    assert cache.cached("frame_style", "img", "model", "prompt", {}, compute, parse=json.loads) == {"words": []}
+    assert len(calls) == 2
+
+def test_stored_value_that_no_longer_parses_is_recomputed(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    cache.cached("chunking", "p", "model", "", {}, lambda: "not json")
+    assert cache.cached("chunking", "p", "model", "", {}, lambda: "[]", parse=json.loads) == []
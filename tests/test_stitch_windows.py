@@ -0,0 +1,32 @@
+from script5_chunk_transcription import split_windows, stitch_windows
+
+def make_words(n):
+    return [{"text": f"w{i}", "start": i * 250, "end": i * 250 + 200, "energy": 0.5} for i in range(n)]
+
+def chunk(words, lo, hi):
+    texts = [w["text"] for w in words[lo:hi]]
+    return {"chunk_text": " ".join(texts), "words": texts,
+            "start_time": words[lo]["start"], "end_time": words[hi - 1]["end"]}
+
+def window_chunks(words, windows, size, skip=()):
+    result = []
+    for start, end, _, _ in windows:
+        result.append([chunk(words, lo, min(lo + size, end)) for lo in range(start, end, size) if (start, lo) not in skip])
+    return result
+
+def covered(stitched):
+    return [word for c in stitched for word in c["words"]]
+
+def test_spilled_chunks_are_trimmed_not_dropped():
+    words = make_words(40)
+    windows = split_windows(words, window_words=15, overlap_words=4)
+    stitched = stitch_windows(words, windows, window_chunks(words, windows, 3), max_words=3)
+    assert covered(stitched) == [w["text"] for w in words]
+
+def test_uncovered_words_are_chunked_locally():
+    words = make_words(40)
+    windows = split_windows(words, window_words=15, overlap_words=4)
+    skip = {(windows[1][0], windows[1][0] + 6)}
+    stitched = stitch_windows(words, windows, window_chunks(words, windows, 3, skip), max_words=3)
+    assert covered(stitched) == [w["text"] for w in words]
+    assert all(len(c["words"]) <= 3 for c in stitched)
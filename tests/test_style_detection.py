@@ -0,0 +1,95 @@
+import json
+
+import cv2
+import numpy as np
+
+import script3_style_detection as detection
+from frame_journal import FrameJournal, journal_path
+from response_cache import ResponseCache
+
+def test_unreadable_frame_is_journaled_without_sinking_its_batch(tmp_path, monkeypatch):
+    frames = tmp_path / "frames"
+    frames.mkdir()
+    for n in (1, 2):
+        noise = np.random.default_rng(n).integers(0, 255, (40, 80, 3), dtype=np.uint8)
+        cv2.imwrite(str(frames / f"frame_{n:04d}.png"), noise)
+    (frames / "frame_0003.png").write_bytes(b"not an image")
+
+    sent = []
+    def fake_batch(batch, prompt, limiter=None):
+        sent.append([i for i, _, _ in batch])
+        return {i: [{"text": f"w{i}"}] for i, _, _ in batch}
+
+    monkeypatch.setattr(detection, "generate_prompt", lambda: "prompt")
+    monkeypatch.setattr(detection, "request_batch_styles", fake_batch)
+    output = tmp_path / "all_frames.json"
+    detection.analyze_frames(str(frames), str(output), batch_size=3)
+
+    assert sent == [[0, 1]]
+    assert [r["frame"] for r in json.loads(output.read_text())] == ["frame_0001.png", "frame_0002.png"]
+    journal = FrameJournal(journal_path(str(output)))
+    assert journal.failed() == ["frame_0003.png"]
+    journal.close()
+
+def test_malformed_reply_is_retried_instead_of_replayed(tmp_path, monkeypatch):
+    frames = tmp_path / "frames"
+    frames.mkdir()
+    cv2.imwrite(str(frames / "frame_0001.png"), np.full((40, 80, 3), 90, dtype=np.uint8))
+
+    replies = iter(["{truncated", '{"words": [{"text": "hi"}]}'])
+    calls = []
+    def fake_completion(content, params, limiter=None):
+        calls.append(1)
+        return next(replies)
+
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(detection, "get_cache", lambda: cache)
+    monkeypatch.setattr(detection, "generate_prompt", lambda: "prompt")
+    monkeypatch.setattr(detection, "request_completion", fake_completion)
+    output = tmp_path / "all_frames.json"
+    detection.analyze_frames(str(frames), str(output), dedup=False, roi=None)
+
+    assert len(calls) == 2
+    assert json.loads(output.read_text())[0]["words"][0]["text"] == "hi"
+
+def write_caption_video(path, captions, fps=10, seconds_each=1):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (160, 90))
+    for text in captions:
+        for _ in range(fps * seconds_each):
+            image = np.zeros((90, 160, 3), dtype=np.uint8)
+            cv2.putText(image, text, (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+            writer.write(image)
+    writer.release()
+
+def test_streamed_events_share_the_journal_and_results_format(tmp_path, monkeypatch):
+    video = tmp_path / "reference.avi"
+    write_caption_video(video, ["I", "WWW WWW", "o"])
+
+    sent = []
+    def fake_batch(batch, prompt, limiter=None):
+        sent.extend(i for i, _, _ in batch)
+        return {i: [{"text": f"w{i}"}] for i, _, _ in batch}
+
+    monkeypatch.setattr(detection, "generate_prompt", lambda: "prompt")
+    monkeypatch.setattr(detection, "request_batch_styles", fake_batch)
+    def fake_single(image_b64, prompt, limiter=None, scale=1.0):
+        sent.append(image_b64)
+        return [{"text": "w"}]
+
+    monkeypatch.setattr(detection, "request_frame_style", fake_single)
+    output = tmp_path / "all_frames.json"
+    frames = tmp_path / "frames"
+    caption_band = (0, 40, 160, 40)
+    detection.analyze_video(str(video), str(output), frames_dir=str(frames), roi=caption_band, batch_size=2,
+                            max_pending=1)
+
+    results = json.loads(output.read_text())
+    assert [r["frame"] for r in results] == ["frame_00000.jpg", "frame_00001.jpg", "frame_00002.jpg"]
+    assert [r["start_ms"] for r in results] == [0, 1000, 2000]
+    assert sent[:2] == [0, 1] and len(sent) == 3  # the last caption is a batch of one
+    assert sorted(json.loads((frames / "frame_times.json").read_text())) == [r["frame"] for r in results]
+
+    sent.clear()
+    detection.analyze_video(str(video), str(output), roi=caption_band, batch_size=2)
+    assert sent == []
+    assert len(json.loads(output.read_text())) == 3
@@ -0,0 +1,32 @@
+import json
+
+import style_packs
+from style_packs import StylePackStore, analysis_fingerprint
+
+def write_reference(tmp_path):
+    video = tmp_path / "reference.mp4"
+    video.write_bytes(b"reference video")
+    paths = {}
+    for name, value in (("filtered", [{"words": [{}, {}]}]), ("templates", [{"name": "Style_1"}]),
+                        ("sequence", {"frame_00000.jpg": {"styles": ["Style_1"]}})):
+        paths[name] = tmp_path / f"{name}.json"
+        paths[name].write_text(json.dumps(value))
+    return video, paths
+
+def test_pack_is_ignored_after_prompt_or_code_changes(tmp_path, monkeypatch):
+    store = StylePackStore(str(tmp_path / "packs"))
+    video, paths = write_reference(tmp_path)
+    monkeypatch.setattr(style_packs, "analysis_fingerprint", lambda: "before")
+    saved = store.save(str(video), str(paths["filtered"]), str(paths["templates"]), str(paths["sequence"]))
+
+    assert store.find(str(video)) == saved
+    monkeypatch.setattr(style_packs, "analysis_fingerprint", lambda: "after")
+    assert store.find(str(video)) is None
+
+def test_fingerprint_follows_the_prompt(tmp_path):
+    prompt = tmp_path / "prompt.txt"
+    prompt.write_text("describe the caption style")
+    before = analysis_fingerprint(str(prompt))
+    assert analysis_fingerprint(str(prompt)) == before
+    prompt.write_text("describe the caption style and colours")
+    assert analysis_fingerprint(str(prompt)) != before
@@ -0,0 +1,28 @@
+from script6_style_templates import cluster_styles
+
+def style(fontsize=32, colour="&HFFFFFF", bold=-1, italic=0, outline=2, shadow=0, fontname="Poppins"):
+    return {"fontname": fontname, "fontsize": fontsize, "primary_colour": colour, "bold": bold,
+            "italic": italic, "outline": outline, "shadow": shadow}
+
+def test_distinct_sizes_stay_distinct():
+    styles = [style(fontsize=size) for size in (24, 28, 32, 40, 48)]
+    assignment = cluster_styles(styles, [5, 4, 3, 2, 1])
+    assert sorted(set(assignment.tolist())) == [0, 1, 2, 3, 4]
+
+def test_bold_and_italic_stay_distinct():
+    styles = [style(), style(bold=0), style(italic=-1)]
+    assert len(set(cluster_styles(styles, [3, 2, 1]).tolist())) == 3
+
+def test_colour_jitter_merges_into_most_used():
+    styles = [style(colour="&H40E4FE"), style(colour="&H42E2FC"), style(colour="&HFFFFFF")]
+    assert cluster_styles(styles, [1, 5, 2]).tolist() == [1, 1, 2]
+
+def test_members_are_compared_to_centre_not_chained():
+    # Each step is within tolerance of its neighbour but the ends are not.
+    styles = [style(outline=outline) for outline in (0, 2, 4, 6)]
+    assignment = cluster_styles(styles, [4, 3, 2, 1], tolerance=1.0)
+    assert assignment.tolist() == [0, 0, 2, 2]
+
+def test_palette_bound_never_merges_across_sizes():
+    styles = [style(fontsize=size) for size in (24, 28, 32)]
+    assert len(set(cluster_styles(styles, [3, 2, 1], max_templates=1).tolist())) == 3
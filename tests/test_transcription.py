@@ -0,0 +1,32 @@
+from concurrent.futures import Future
+
+import pytest
+
+import script1_transcription as transcription
+
+class FakeJobs:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, video_path, output_path, prosody=False):
+        self.submitted.append((video_path, output_path, prosody))
+        future = Future()
+        if video_path == "broken.mp4":
+            future.set_exception(RuntimeError("upload failed"))
+        else:
+            future.set_result([{"text": video_path}])
+        return future
+
+def test_all_files_are_submitted_before_waiting(monkeypatch):
+    jobs = FakeJobs()
+    monkeypatch.setattr(transcription, "get_transcription_jobs", lambda: jobs)
+    pairs = [("a.mp4", "a.json"), ("broken.mp4", "b.json"), ("c.mp4", "c.json")]
+
+    results = transcription.transcribe_videos(pairs, prosody=True, return_exceptions=True)
+    assert [video for video, _, _ in jobs.submitted] == ["a.mp4", "broken.mp4", "c.mp4"]
+    assert all(prosody for _, _, prosody in jobs.submitted)
+    assert results[0] == [{"text": "a.mp4"}] and results[2] == [{"text": "c.mp4"}]
+    assert isinstance(results[1], RuntimeError)
+
+    with pytest.raises(RuntimeError):
+        transcription.transcribe_videos(pairs)